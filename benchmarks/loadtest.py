@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This code is distributed under the terms and conditions
+# from the Apache License, Version 2.0
+#
+# http://opensource.org/licenses/apache2.0.php
+
+"""
+Concurrency load test for SqliteDict: drive a database with a mix of reader
+and writer threads, in one or more processes, then report the throughput and
+latency percentiles of each operation, and the depth of the request queue.
+
+Run with, e.g.:
+
+python benchmarks/loadtest.py --readers 8 --writers 2 --processes 2 --distribution zipf --duration 10
+
+See `python benchmarks/loadtest.py --help` for all the options.
+"""
+
+import argparse
+import bisect
+import itertools
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlitedict import SqliteDict
+
+OPERATIONS = ['read', 'write']
+
+
+def key_chooser(distribution, num_keys, zipf_s=1.1, seed=None):
+    """Return a function that picks a random key index in [0, num_keys), following `distribution`."""
+    rnd = random.Random(seed)
+    if distribution == 'uniform':
+        return lambda: rnd.randrange(num_keys)
+    if distribution == 'zipf':
+        # key index i is picked with probability proportional to 1 / (i + 1) ** s
+        cumulative = list(itertools.accumulate(1.0 / (i + 1) ** zipf_s for i in range(num_keys)))
+        total = cumulative[-1]
+        return lambda: min(bisect.bisect_left(cumulative, rnd.random() * total), num_keys - 1)
+    raise ValueError('Unrecognized distribution: %r' % distribution)
+
+
+def percentile(sorted_values, q):
+    """The `q`-th quantile (0 <= q <= 1) of the already sorted list `sorted_values`."""
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[int(round(q * (len(sorted_values) - 1)))]
+
+
+def run_clients(filename, options, seed):
+    """
+    Run the reader and writer threads of one process against `filename`, for `options.duration` seconds.
+
+    Returns a dict of operation => list of latencies (in seconds), and the list of sampled queue depths.
+    """
+    db = SqliteDict(
+        filename, autocommit=options.autocommit, journal_mode=options.journal_mode,
+        commit_every=options.commit_every, outer_stack=False,
+    )
+    value = os.urandom(options.value_size)
+    deadline = time.time() + options.duration
+    latencies = dict((op, []) for op in OPERATIONS)
+    depths = []
+
+    def client(op, client_seed):
+        choose = key_chooser(options.distribution, options.keys, options.zipf_s, client_seed)
+        results = []
+        while time.time() < deadline:
+            key = 'key%d' % choose()
+            start = time.perf_counter()
+            if op == 'read':
+                db.get(key)
+            else:
+                db[key] = value
+                if options.sync_writes:
+                    db.commit()
+            results.append(time.perf_counter() - start)
+        latencies[op].extend(results)  # list.extend is atomic, no lock needed
+
+    def monitor():
+        while time.time() < deadline:
+            depths.append(db.conn.reqs.qsize())
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=monitor)]
+    for i in range(options.readers):
+        threads.append(threading.Thread(target=client, args=('read', seed * 1000 + i)))
+    for i in range(options.writers):
+        threads.append(threading.Thread(target=client, args=('write', seed * 1000 + options.readers + i)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.commit()
+    db.close()
+    return latencies, depths
+
+
+def _run_process(args):
+    return run_clients(*args)
+
+
+def prepare(filename, options):
+    """Fill the database with `options.keys` keys, so that the reads hit existing values."""
+    with SqliteDict(filename, flag='n', journal_mode=options.journal_mode) as db:
+        value = os.urandom(options.value_size)
+        db.bulk_load(('key%d' % i, value) for i in range(options.keys))
+
+
+def report(latencies, depths, options):
+    print('%d reader(s) and %d writer(s) in %d process(es), %d keys (%s), %d byte values, %.1f s' % (
+        options.readers, options.writers, options.processes, options.keys, options.distribution,
+        options.value_size, options.duration))
+    print('autocommit=%s commit_every=%s journal_mode=%s sync_writes=%s' % (
+        options.autocommit, options.commit_every, options.journal_mode, options.sync_writes))
+    print()
+    print('%-6s %10s %10s %10s %10s %10s %10s' % ('op', 'count', 'ops/s', 'p50 ms', 'p99 ms', 'p999 ms', 'max ms'))
+    for op in OPERATIONS:
+        values = sorted(latencies[op])
+        if not values:
+            continue
+        print('%-6s %10d %10.0f %10.3f %10.3f %10.3f %10.3f' % (
+            op, len(values), len(values) / options.duration,
+            1000 * percentile(values, 0.5), 1000 * percentile(values, 0.99),
+            1000 * percentile(values, 0.999), 1000 * values[-1]))
+    depths = sorted(depths)
+    if depths:
+        print()
+        print('request queue depth: mean %.1f, p50 %d, p99 %d, max %d' % (
+            sum(depths) / float(len(depths)), percentile(depths, 0.5), percentile(depths, 0.99), depths[-1]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filename', help='database file to use (default: a temporary file)')
+    parser.add_argument('--readers', type=int, default=4, help='reader threads per process')
+    parser.add_argument('--writers', type=int, default=1, help='writer threads per process')
+    parser.add_argument('--processes', type=int, default=1, help='client processes')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds to run for')
+    parser.add_argument('--keys', type=int, default=10000, help='number of distinct keys')
+    parser.add_argument('--distribution', choices=['uniform', 'zipf'], default='uniform',
+                        help='distribution of the keys read and written')
+    parser.add_argument('--zipf-s', type=float, default=1.1, help='exponent of the zipf distribution')
+    parser.add_argument('--value-size', type=int, default=100, help='size of the values, in bytes')
+    parser.add_argument('--autocommit', action='store_true', help='open the SqliteDict with autocommit')
+    parser.add_argument('--commit-every', type=int, default=None, help='group commit after that many writes')
+    parser.add_argument('--sync-writes', action='store_true', help='call commit() after each write')
+    parser.add_argument('--journal-mode', default='WAL', help='SQLite journal mode')
+    options = parser.parse_args(argv)
+
+    filename = options.filename
+    if filename is None:
+        fd, filename = tempfile.mkstemp(prefix='sqlitedict-loadtest')
+        os.close(fd)
+    try:
+        prepare(filename, options)
+        if options.processes > 1:
+            with multiprocessing.Pool(options.processes) as pool:
+                results = pool.map(_run_process, [(filename, options, seed) for seed in range(options.processes)])
+        else:
+            results = [run_clients(filename, options, 0)]
+    finally:
+        if options.filename is None:
+            for path in (filename, filename + '-wal', filename + '-shm'):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    latencies = dict((op, []) for op in OPERATIONS)
+    depths = []
+    for process_latencies, process_depths in results:
+        for op in OPERATIONS:
+            latencies[op].extend(process_latencies[op])
+        depths.extend(process_depths)
+    report(latencies, depths, options)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,13 +28,26 @@ don't forget to call `mydict.commit()` when done with a transaction.
 
 import sqlite3
 import os
+import io
+import random
+import struct
 import sys
 import tempfile
 import threading
+import time
 import logging
 import traceback
 from base64 import b64decode, b64encode
 import weakref
+import json
+import itertools
+import functools
+import hashlib
+import math
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.request import pathname2url
 
 __version__ = '2.1.0'
 
@@ -48,9 +61,9 @@ def reraise(tp, value, tb=None):
 
 
 try:
-    from cPickle import dumps, loads, HIGHEST_PROTOCOL as PICKLE_PROTOCOL
+    from cPickle import dump, dumps, load, loads, HIGHEST_PROTOCOL as PICKLE_PROTOCOL
 except ImportError:
-    from pickle import dumps, loads, HIGHEST_PROTOCOL as PICKLE_PROTOCOL
+    from pickle import dump, dumps, load, loads, HIGHEST_PROTOCOL as PICKLE_PROTOCOL
 
 # some Python 3 vs 2 imports
 try:
@@ -59,9 +72,14 @@ except ImportError:
     from UserDict import DictMixin as DictClass
 
 try:
-    from queue import Queue
+    from queue import Queue, Empty, Full
 except ImportError:
-    from Queue import Queue
+    from Queue import Queue, Empty, Full
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # only needed by encode_array() and friends
 
 
 logger = logging.getLogger(__name__)
@@ -74,6 +92,12 @@ logger = logging.getLogger(__name__)
 #
 # _REQUEST_CLOSE: request that the SQL connection be closed
 # _REQUEST_COMMIT: request that any changes be committed to the DB
+# _REQUEST_BACKUP: request an online copy of the DB, to or from another DB
+# _REQUEST_EXECUTEMANY: request that SQL commands be run for whole batches of arguments, atomically
+# _REQUEST_SAVEPOINT, _REQUEST_RELEASE, _REQUEST_ROLLBACK: request that a savepoint be
+#   opened, released (kept) or rolled back (and released)
+# _REQUEST_SELECT_BATCHES: request a SELECT whose records are sent back in lists, batch by batch
+# _REQUEST_CALL: request that a function be called with the connection, atomically, and its result sent back
 #
 # Responses are either SQL records (e.g. results of a SELECT) or the magic
 # _RESPONSE_NO_MORE command, which indicates nothing else will ever be written
@@ -81,7 +105,18 @@ logger = logging.getLogger(__name__)
 #
 _REQUEST_CLOSE = '--close--'
 _REQUEST_COMMIT = '--commit--'
+_REQUEST_BACKUP = '--backup--'
+_REQUEST_EXECUTEMANY = '--executemany--'
+_REQUEST_SAVEPOINT = '--savepoint--'
+_REQUEST_RELEASE = '--release--'
+_REQUEST_ROLLBACK = '--rollback--'
+_REQUEST_SELECT_BATCHES = '--select-batches--'
+_REQUEST_CALL = '--call--'
 _RESPONSE_NO_MORE = '--no more--'
+_RESPONSE_TIMED_OUT = '--timed out--'
+
+# SQLite virtual machine instructions between two checks of the deadline of a running statement
+_PROGRESS_STEPS = 1000
 
 #
 # We work with weak references for better memory efficiency.
@@ -90,6 +125,12 @@ _RESPONSE_NO_MORE = '--no more--'
 #
 _PUT_OK, _PUT_REFERENT_DESTROYED, _PUT_NOOP = 0, 1, 2
 
+# unique names for the savepoints of SqliteDict.transaction()
+_savepoint_ids = itertools.count()
+
+# marks a missing value in the read-modify-write operations of SqliteDict
+_MISSING = object()
+
 
 def _put(queue_reference, item):
     if queue_reference is not None:
@@ -142,13 +183,351 @@ def identity(obj):
     return obj
 
 
+# encode_array() header: dtype string length, number of dimensions; then the dtype string and the dimensions
+_ARRAY_HEADER = struct.Struct('<BB')
+_ARRAY_DIM = struct.Struct('<Q')
+
+# struct format characters of the dtypes that decode_array() can view without NumPy
+_ARRAY_FORMATS = {
+    'i1': 'b', 'u1': 'B', 'i2': 'h', 'u2': 'H', 'i4': 'i', 'u4': 'I', 'i8': 'q', 'u8': 'Q',
+    'f4': 'f', 'f8': 'd', 'b1': '?',
+}
+
+
+def encode_array(arr):
+    """
+    Serialize a NumPy array as its dtype, shape and raw data, behind a compact header.
+
+    Much cheaper than pickling, both in time and space. Use together with
+    `decode_array`, e.g. `SqliteDict(..., encode=encode_array, decode=decode_array)`.
+    """
+    if numpy is None:
+        raise ImportError('encode_array requires NumPy')
+    arr = numpy.require(arr, requirements='C')
+    if arr.dtype.hasobject:
+        raise ValueError('Cannot encode arrays of Python objects, got dtype %s' % arr.dtype)
+    dtype = arr.dtype.str.encode('ascii')
+    header = _ARRAY_HEADER.pack(len(dtype), arr.ndim) + dtype + b''.join(_ARRAY_DIM.pack(dim) for dim in arr.shape)
+    return b''.join((header, arr.data))
+
+
+def _array_header(obj):
+    """Parse the header written by `encode_array`: return (dtype string, shape, offset of the data)."""
+    dtype_len, ndim = _ARRAY_HEADER.unpack_from(obj)
+    offset = _ARRAY_HEADER.size + dtype_len
+    dtype = bytes(obj[_ARRAY_HEADER.size:offset]).decode('ascii')
+    shape = tuple(_ARRAY_DIM.unpack_from(obj, offset + i * _ARRAY_DIM.size)[0] for i in range(ndim))
+    return dtype, shape, offset + ndim * _ARRAY_DIM.size
+
+
+def decode_array(obj):
+    """
+    Deserialize an array stored by `encode_array`.
+
+    With NumPy, the result is a read-only array viewing the retrieved buffer
+    directly, without copying it (call `.copy()` on it to modify it). Without
+    NumPy, the result is a memoryview of the same shape, for the common numeric
+    dtypes in native byte order, or a flat memoryview of the raw bytes otherwise.
+    """
+    dtype, shape, offset = _array_header(obj)
+    if numpy is not None:
+        return numpy.frombuffer(obj, dtype=dtype, offset=offset).reshape(shape)
+    data = memoryview(obj)[offset:].cast('B')
+    native = dtype[0] in '|=' or dtype[0] == ('<' if sys.byteorder == 'little' else '>')
+    format = _ARRAY_FORMATS.get(dtype[1:])
+    if not native or format is None:
+        return data
+    return data.cast(format, shape)
+
+
+def _object_array(items):
+    """Put the objects `items` into a 1-D NumPy array, as they are (sequences are not unpacked)."""
+    arr = numpy.empty(len(items), dtype=object)
+    for i, item in enumerate(items):
+        arr[i] = item
+    return arr
+
+
+def _call_atomically(conn, fn, args):
+    """
+    Return `fn(conn, *args)`, called inside a transaction (the current one, or a new one),
+    so that all its changes are rolled back if it raises.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN')
+    conn.execute('SAVEPOINT "sqlitedict_call"')
+    try:
+        result = fn(conn, *args)
+    except BaseException:
+        conn.execute('ROLLBACK TO "sqlitedict_call"')
+        conn.execute('RELEASE "sqlitedict_call"')
+        raise
+    conn.execute('RELEASE "sqlitedict_call"')
+    return result
+
+
+def _args_size(args):
+    """Approximate size in bytes of the SQL arguments `args`, counting only strings and blobs."""
+    return sum(len(arg) for arg in args if isinstance(arg, (bytes, str, memoryview)))
+
+
+def _chunked(iterable, size):
+    """Split `iterable` into lists of at most `size` items, lazily."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _imap_chunks(func, chunks, workers=0, pool='thread'):
+    """
+    Yield `func(chunk)` for each chunk of `chunks`, in order.
+
+    With `workers` > 0, the calls run in parallel in a pool of `workers` threads
+    (`pool='thread'`) or processes (`pool='process'`), with at most `2 * workers`
+    chunks in flight at any time. With processes, `func` and the chunks must be picklable.
+    """
+    if not workers:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+
+    if pool == 'thread':
+        executor_class = ThreadPoolExecutor
+    elif pool == 'process':
+        executor_class = ProcessPoolExecutor
+    else:
+        raise ValueError("Unrecognized pool: %r, expected 'thread' or 'process'" % pool)
+
+    with executor_class(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _key_order(key):
+    """
+    Sort key for encoded keys, in the order of the TEXT key column: numbers are
+    stored as text, and blobs come after all text.
+    """
+    if isinstance(key, (bytes, memoryview)):
+        return (1, bytes(key))
+    return (0, key if isinstance(key, str) else str(key))
+
+
+def _encode_items(encode_key, encode, items):
+    """Encode a chunk of (key, value) pairs, for storing in SQLite."""
+    return [(encode_key(key), encode(value)) for key, value in items]
+
+
+def _encode_items_picklable(encode_key, encode, items):
+    """Like `_encode_items`, but the result can be sent back from a process pool."""
+    return [
+        (key, bytes(value) if isinstance(value, memoryview) else value)
+        for key, value in _encode_items(encode_key, encode, items)
+    ]
+
+
+def _decode_values(decode, rows):
+    """Decode a chunk of (value,) rows retrieved from SQLite."""
+    return [decode(value) for value, in rows]
+
+
+def _decode_items(decode_key, decode, rows):
+    """Decode a chunk of (key, value) rows retrieved from SQLite."""
+    return [(decode_key(key), decode(value)) for key, value in rows]
+
+
+# upper bounds of the buckets of SqliteDict.storage_stats()['value_size_histogram']
+_SIZE_BUCKETS = [0] + [1 << i for i in range(41)]
+
+
+def _storage_stats(query, tablename):
+    """
+    The statistics of `SqliteDict.storage_stats()` for the table `tablename` (unescaped),
+    using `query(sql, args)` that returns the list of resulting rows.
+    """
+    table = tablename.replace('"', '""')
+    columns = [row[1] for row in query('PRAGMA table_info("%s")' % table)]
+    HAS_TABLE = 'SELECT 1 FROM sqlite_master WHERE type = "table" AND name = ?'
+    dedup = bool(query(HAS_TABLE, (tablename + '__content',)))
+    # with dedup, the table holds the hashes of the values, which are in the content table
+    values_table = table + '__values' if dedup else table
+    stats = {}
+    if 'key' in columns and 'value' in columns:
+        GET_SIZES = (
+            'SELECT COUNT(*), TOTAL(length(CAST(key AS BLOB))), TOTAL(length(CAST(value AS BLOB))), '
+            'MAX(length(CAST(value AS BLOB))) FROM "%s"'
+        ) % values_table
+        rows, key_bytes, value_bytes, max_value_bytes = query(GET_SIZES)[0]
+        stats.update(
+            rows=rows,
+            key_bytes=int(key_bytes),
+            value_bytes=int(value_bytes),
+            avg_key_bytes=key_bytes / rows if rows else 0.0,
+            avg_value_bytes=value_bytes / rows if rows else 0.0,
+            max_value_bytes=max_value_bytes or 0,
+        )
+        if dedup:
+            GET_STORED = 'SELECT TOTAL(length(CAST(value AS BLOB))) FROM "%s__content"' % table
+            stats['stored_value_bytes'] = int(query(GET_STORED)[0][0])
+        BUCKET = 'CASE %s END' % ' '.join('WHEN size <= %d THEN %d' % (bound, bound) for bound in _SIZE_BUCKETS)
+        GET_HISTOGRAM = (
+            'SELECT %s AS bucket, COUNT(*) FROM (SELECT length(CAST(value AS BLOB)) AS size FROM "%s") '
+            'GROUP BY bucket ORDER BY bucket'
+        ) % (BUCKET, values_table)
+        stats['value_size_histogram'] = dict(query(GET_HISTOGRAM))
+    else:
+        stats['rows'] = query('SELECT COUNT(*) FROM "%s"' % table)[0][0]
+
+    GET_INDEXES = 'SELECT name FROM sqlite_master WHERE type = "index" AND tbl_name = ?'
+    names = [tablename] + [name for name, in query(GET_INDEXES, (tablename,))]
+    if dedup:
+        names += [tablename + '__content'] + [name for name, in query(GET_INDEXES, (tablename + '__content',))]
+    GET_PAGES = (
+        'SELECT name, COUNT(*), TOTAL(pagetype = "overflow"), TOTAL(pgsize) FROM dbstat '
+        'WHERE name IN (%s) GROUP BY name'
+    ) % ', '.join('?' * len(names))
+    try:
+        pages = query(GET_PAGES, tuple(names))
+    except sqlite3.OperationalError:  # SQLite compiled without SQLITE_ENABLE_DBSTAT_VTAB
+        stats['pages'] = None
+    else:
+        stats['pages'] = dict((name, {'pages': 0, 'overflow_pages': 0, 'bytes': 0}) for name in names)
+        for name, count, overflow, size in pages:
+            stats['pages'][name] = {'pages': count, 'overflow_pages': int(overflow), 'bytes': int(size)}
+
+    FILE_PRAGMAS = [('page_size', 'page_size'), ('page_count', 'page_count'), ('freelist_pages', 'freelist_count')]
+    for name, pragma in FILE_PRAGMAS:
+        stats[name] = query('PRAGMA %s' % pragma)[0][0]
+    return stats
+
+
+def _bloom_key(encoded_key):
+    """
+    The bytes hashed into a Bloom filter for `encoded_key`, as SQLite stores it
+    (integers in the TEXT column become text), or None for keys it can't track.
+    """
+    if isinstance(encoded_key, str):
+        return encoded_key.encode('utf-8', 'surrogatepass')
+    if isinstance(encoded_key, bytes):
+        return b'\0' + encoded_key  # BLOB keys never equal TEXT keys
+    if isinstance(encoded_key, int) and not isinstance(encoded_key, bool):
+        return str(encoded_key).encode('ascii')
+    return None
+
+
+_BLOOM_HASH = struct.Struct('<QQ')
+
+
+def _content_hash(value):
+    """The hash that identifies an encoded value in the content table of a deduplicating SqliteDict."""
+    h = hashlib.blake2b(digest_size=32)
+    if isinstance(value, str):
+        h.update(b's')
+        h.update(value.encode('utf-8', 'surrogatepass'))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        h.update(b'b')
+        h.update(value)
+    else:
+        h.update(b'r')
+        h.update(repr(value).encode('utf-8'))
+    return h.digest()
+
+
+class _BloomFilter(object):
+    """
+    A set of encoded keys that may answer "maybe" for keys it doesn't contain, at
+    a rate of `error_rate` while it holds up to `capacity` keys, but never "no"
+    for keys it does contain. Takes at most `max_bytes` of memory, at the cost of
+    a higher error rate if that's too little.
+
+    `count` and `deleted` count the keys added and deleted since it was built.
+    """
+    def __init__(self, capacity, error_rate=0.01, max_bytes=None, bits=None, num_hashes=None):
+        if bits is None:
+            num_bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+            if max_bytes is not None:
+                num_bits = min(num_bits, 8 * max_bytes)
+            bits = bytearray(max(int(math.ceil(num_bits / 8)), 8))
+        self.bits = bytearray(bits)
+        self.num_bits = 8 * len(self.bits)
+        self.num_hashes = num_hashes or max(1, int(round(self.num_bits / float(capacity) * math.log(2))))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self.deleted = 0
+
+    def _positions(self, data):
+        # double hashing: k positions out of the two halves of a single 128-bit hash
+        h1, h2 = _BLOOM_HASH.unpack(hashlib.blake2b(data, digest_size=16).digest())
+        h2 |= 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, encoded_keys):
+        """Add the `encoded_keys`. Not thread-safe."""
+        bits = self.bits
+        for encoded_key in encoded_keys:
+            data = _bloom_key(encoded_key)
+            if data is not None:
+                for position in self._positions(data):
+                    bits[position >> 3] |= 1 << (position & 7)
+                self.count += 1
+
+    def __contains__(self, encoded_key):
+        data = _bloom_key(encoded_key)
+        if data is None:
+            return True
+        bits = self.bits
+        for position in self._positions(data):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+EXPORT_FORMATS = ['jsonl', 'pickle']
+
+
+def read_export(filename, format='jsonl'):
+    """
+    Iterate over the (key, value) pairs stored in a file written by `SqliteDict.export()`.
+
+    The result can be passed straight to `SqliteDict.bulk_load()` or `SqliteDict.update()`.
+    """
+    if format == 'jsonl':
+        with io.open(filename, 'r', encoding='utf8') as fin:
+            for line in fin:
+                record = json.loads(line)
+                yield record['key'], record['value']
+    elif format == 'pickle':
+        with io.open(filename, 'rb') as fin:
+            while True:
+                try:
+                    yield load(fin)
+                except EOFError:
+                    return
+    else:
+        raise ValueError('Unrecognized export format: %s' % format)
+
+
 class SqliteDict(DictClass):
     VALID_FLAGS = ['c', 'r', 'w', 'n']
 
     def __init__(self, filename=None, tablename='unnamed', flag='c',
                  autocommit=False, journal_mode="DELETE", encode=encode,
                  decode=decode, encode_key=identity, decode_key=identity,
-                 timeout=5, outer_stack=True):
+                 timeout=5, outer_stack=True, immutable=False, commit_every=None,
+                 commit_interval=None, changelog=False, slow_threshold=None, on_slow=None,
+                 explain_slow=False, trace_sample=1.0, read_priority=None, max_queue_items=None,
+                 max_queue_bytes=None, queue_timeout=None, threaded=True, bloom_filter=False,
+                 bloom_error_rate=0.01, bloom_max_bytes=None, bloom_persist=False, dedup=False,
+                 op_timeout=None):
         """
         Initialize a thread-safe sqlite-backed dictionary. The dictionary will
         be a table `tablename` in database file `filename`. A single file (=database)
@@ -161,6 +540,19 @@ class SqliteDict(DictClass):
         (more inefficient but safer). Otherwise, changes are committed on `self.commit()`,
         `self.clear()` and `self.close()`.
 
+        Group commit is a middle ground between the two: set `commit_every` to
+        commit after that many operations, and/or `commit_interval` to commit
+        once the oldest uncommitted change is that many seconds old, whichever
+        comes first. This bounds the changes lost in a crash, at close to the
+        throughput of committing by hand. Use it with `autocommit=False`.
+        Use `transaction()` to group changes atomically.
+
+        Set `changelog` to record every change in the side table
+        `<tablename>__changelog`, as (sequence number, operation, key) entries
+        written in the same transaction as the change itself. Incremental
+        consumers can then read just the changes since their last run, with
+        `changes_since()`. See also `truncate_changes()`.
+
         Set `journal_mode` to 'OFF' if you're experiencing sqlite I/O problems
         or if you need performance and don't care about crash-consistency.
 
@@ -168,12 +560,96 @@ class SqliteDict(DictClass):
         to the error logs.  This may improve the efficiency of sqlitedict
         operation at the expense of a detailed exception trace.
 
+        Set `slow_threshold` (in seconds) to report the operations that take
+        longer than that, counting both the time spent waiting in the queue and
+        the execution itself (including any automatic commit). Each report is a
+        dict passed to `on_slow(report)`, in the worker thread, or logged as a
+        warning by default; see `SqliteMultithread` for its contents. With
+        `explain_slow`, the report also includes the `EXPLAIN QUERY PLAN` of the
+        SQL. Set `trace_sample` to a fraction of operations to time, in order to
+        keep the overhead down on busy dicts.
+
+        By default, all operations are served in the order they were issued in.
+        Set `read_priority` to let reads overtake the writes (and commits etc.)
+        waiting in the queue: up to `read_priority` reads are served in a row
+        while writes are waiting, then one write, and so on (`float('inf')`
+        for strict priority). This keeps the latency of reads flat while a
+        large update or a background job is writing. A thread always sees its
+        own writes, but may not yet see those just issued by other threads.
+
+        Writes don't wait for SQLite by default: they are queued, and the queue
+        grows without bounds if they come faster than the disk can take them.
+        Set `max_queue_items` and/or `max_queue_bytes` (the total size of the
+        queued keys and values) to limit it: a write that would go over the limit
+        then waits for room in the queue, at most `queue_timeout` seconds (None:
+        forever) before raising `queue.Full`. `self.conn.throttled` and
+        `self.conn.throttled_seconds` count the writes that had to wait, and
+        the total time they waited.
+
         The `flag` parameter. Exactly one of:
           'c': default mode, open for read/write, creating the db/table if necessary.
           'w': open for r/w, but drop `tablename` contents first (start with empty table)
           'r': open as read-only
           'n': create a new database (erasing any existing tables, not just `tablename`!).
 
+        Set `immutable` (only allowed with flag='r') for serving database files that
+        never change while open, such as build artifacts. The file is then opened
+        with `immutable=1`, which skips all file locking and change detection, and
+        memory-mapped. Each thread reads through its own connection, so reads from
+        many threads run in parallel instead of queueing up in a worker thread.
+        Never use `immutable` on a file that may be modified by anyone, the results
+        of reading such a file are undefined.
+
+        Set `op_timeout` (in seconds) to make the operations that wait for SQLite
+        raise TimeoutError instead of waiting any longer, when the database is
+        locked or the worker thread is busy with a large write, for instance; see
+        also `deadline()`. Reads that timed out are cancelled, or interrupted if
+        already running. Writes are never dropped once queued: a write that timed
+        out waiting for room in the queue (see `max_queue_items`) was not made,
+        but the batches `update()` already queued and e.g. a `commit()` that
+        timed out still happen. With `threaded=False`, writes run in the calling
+        thread, so they are interrupted too, and raise TimeoutError: a lock held
+        by another connection is only waited for until the deadline.
+
+        Set `threaded` to False for a SqliteDict used by a single thread only: the
+        operations then run directly in the calling thread, without the handing
+        over to and from a worker thread, which makes point reads and writes
+        several times faster. Using it from any other thread raises RuntimeError.
+        Errors are raised by the operation that caused them, and the options of
+        the request queue (`read_priority`, `max_queue_*`, slow log) do not apply.
+
+        Set `bloom_filter` to keep a Bloom filter of the keys in memory, for
+        workloads where most lookups miss: `in`, `[]` and `get()` then answer
+        most misses on the spot, without a round trip to SQLite. The filter
+        answers "maybe" for about `bloom_error_rate` of the missing keys, and
+        takes at most `bloom_max_bytes` of memory (at the cost of a higher error
+        rate if that's too little; about 1.2 bytes per key for 1%). It's built
+        at open by reading all the keys, and kept up to date by the writes of
+        this SqliteDict; it's rebuilt when it gets full, or once deletes reach
+        `BLOOM_REBUILD_DELETES` of its keys (the write that crosses the
+        threshold pays for it). Writes by anyone else (another SqliteDict,
+        another process) are NOT seen: use it only when this SqliteDict is the
+        only writer of its table, or call `rebuild_bloom()` after such writes.
+        With `bloom_persist`, the filter is saved in the side table
+        `<tablename>__bloom` on close, and loaded back on open instead of
+        reading all the keys, unless the table was changed by anyone in the
+        meantime (tracked by triggers, which add a little to every write).
+
+        Set `dedup` to store each distinct value only once, for tables where
+        many keys have the same (large) value. The encoded values then go into
+        the side table `<tablename>__content`, keyed by their hash, with a
+        count of the keys referring to them, and the table itself stores just
+        the hashes; the values are read through the view `<tablename>__values`.
+        The reference counts are kept by triggers, in the same transaction as
+        the writes. Values no longer referred to stay around (and get reused if
+        written again) until `collect_garbage()`. A table must always be opened
+        with the `dedup` it was created with. JSON indexes are not available.
+
+        A SqliteDict survives `os.fork()`: a child process that inherits it opens a
+        fresh connection to the same file (uncommitted changes of the parent are not
+        visible to it), and in-memory data is lost. A SqliteDict can also be pickled,
+        see `__reduce__`, e.g. to hand it over to the workers of a process pool.
+
         The `encode` and `decode` parameters are used to customize how the values
         are serialized and deserialized.
         The `encode` parameter must be a function that takes a single Python
@@ -193,7 +669,10 @@ class SqliteDict(DictClass):
 
         if flag not in SqliteDict.VALID_FLAGS:
             raise RuntimeError("Unrecognized flag: %s" % flag)
+        if immutable and flag != 'r':
+            raise RuntimeError("The immutable mode requires flag='r', got: %s" % flag)
         self.flag = flag
+        self.immutable = immutable
 
         if flag == 'n':
             if os.path.exists(filename):
@@ -211,39 +690,190 @@ class SqliteDict(DictClass):
         self.tablename = tablename.replace('"', '""')
 
         self.autocommit = autocommit
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.changelog = changelog
         self.journal_mode = journal_mode
         self.encode = encode
         self.decode = decode
         self.encode_key = encode_key
         self.decode_key = decode_key
         self._outer_stack = outer_stack
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self.explain_slow = explain_slow
+        self.trace_sample = trace_sample
+        self.read_priority = read_priority
+        self.max_queue_items = max_queue_items
+        self.max_queue_bytes = max_queue_bytes
+        self.queue_timeout = queue_timeout
+        self.threaded = threaded
+        self.bloom_filter = bloom_filter
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_max_bytes = bloom_max_bytes
+        self.bloom_persist = bloom_persist
+        self.dedup = dedup
+        self.op_timeout = op_timeout
+        # the table, or with dedup the view, to read the values from
+        self._values_table = '%s__values' % self.tablename if dedup else self.tablename
+        self._bloom = None  # the _BloomFilter of the keys, see rebuild_bloom()
+        self._bloom_next = None  # the filter being rebuilt, which also receives all new keys
+        self._bloom_lock = threading.RLock()
+        self._indexes = {}  # index name => extractor function, see add_index()
+        self._local = threading.local()  # per-thread state: nesting of transaction() blocks
+        self._transaction_lock = threading.Lock()  # held by the thread in an outermost transaction() block
 
         logger.debug("opening Sqlite table %r in %r" % (tablename, filename))
         self.conn = self._new_conn()
+        _open_dicts[id(self)] = self
         if self.flag == 'r':
-            if self.tablename not in SqliteDict.get_tablenames(self.filename):
+            HAS_TABLE = 'SELECT 1 FROM sqlite_master WHERE type = "table" AND name = ?'
+            if self.conn.select_one(HAS_TABLE, (tablename,)) is None:
                 msg = 'Refusing to create a new table "%s" in read-only DB mode' % tablename
                 raise RuntimeError(msg)
+            self._check_dedup()
         else:
             MAKE_TABLE = 'CREATE TABLE IF NOT EXISTS "%s" (key TEXT PRIMARY KEY, value BLOB)' % self.tablename
             self.conn.execute(MAKE_TABLE)
+            self._check_dedup()
+            if self.dedup:
+                self._make_content_table()
+            if self.changelog:
+                MAKE_CHANGELOG = (
+                    'CREATE TABLE IF NOT EXISTS "%s__changelog" '
+                    '(seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT, key TEXT)'
+                ) % self.tablename
+                self.conn.execute(MAKE_CHANGELOG)
+            if self.bloom_filter and self.bloom_persist:
+                self._make_bloom_table()
             self.conn.commit()
         if flag == 'w':
             self.clear()
+        if self.bloom_filter:
+            self._open_bloom()
 
     def _new_conn(self):
+        if self.immutable:
+            return SqliteImmutable(self.filename, op_timeout=self.op_timeout)
+        if not self.threaded:
+            return SqliteInline(
+                self.filename,
+                autocommit=self.autocommit,
+                journal_mode=self.journal_mode,
+                commit_every=self.commit_every,
+                commit_interval=self.commit_interval,
+                op_timeout=self.op_timeout,
+            )
         return SqliteMultithread(
             self.filename,
             autocommit=self.autocommit,
             journal_mode=self.journal_mode,
             outer_stack=self._outer_stack,
+            commit_every=self.commit_every,
+            commit_interval=self.commit_interval,
+            slow_threshold=self.slow_threshold,
+            on_slow=self.on_slow,
+            explain_slow=self.explain_slow,
+            trace_sample=self.trace_sample,
+            read_priority=self.read_priority,
+            max_queue_items=self.max_queue_items,
+            max_queue_bytes=self.max_queue_bytes,
+            queue_timeout=self.queue_timeout,
+            op_timeout=self.op_timeout,
+        )
+
+    @property
+    def conn(self):
+        """The connection (a SqliteMultithread, SqliteInline or SqliteImmutable), or None once closed."""
+        if self._stale_conn:
+            # first use in a forked child process, see _after_fork()
+            self._stale_conn = False
+            self._conn = self._new_conn()
+        return self._conn
+
+    @conn.setter
+    def conn(self, conn):
+        self._conn = conn
+        self._stale_conn = False
+
+    _stale_conn = False  # inherited from the parent process, to be replaced on first use
+
+    def _after_fork(self):
+        """
+        In a forked child process: mark the inherited connection, whose worker
+        thread didn't survive the fork, for replacement by a fresh one on first
+        use. Many children never use it, e.g. the workers of a process pool.
+        """
+        # the parent process owns the temporary file, and any changes it didn't commit yet
+        self.in_temp = False
+        self._local = threading.local()
+        self._bloom_lock = threading.RLock()  # may have been held by another thread of the parent
+        self._transaction_lock = threading.Lock()
+        self._bloom_next = None
+        if getattr(self, '_conn', None) is not None:
+            self._stale_conn = True
+
+    def __reduce__(self):
+        """
+        Pickle a handle that opens the same table of the same file anew, with the same
+        settings, e.g. to pass the SqliteDict to the workers of a `multiprocessing` pool.
+
+        Only committed changes are visible to the copy. The `encode`/`decode`
+        functions and the extractors of the secondary indexes must be picklable.
+        """
+        if self.filename == ':memory:':
+            raise TypeError('Cannot pickle an in-memory SqliteDict')
+        settings = dict(
+            filename=self.filename,
+            tablename=self.tablename.replace('""', '"'),
+            flag='c' if self.flag in ('w', 'n') else self.flag,  # don't erase the data again
+            autocommit=self.autocommit,
+            journal_mode=self.journal_mode,
+            encode=self.encode,
+            decode=self.decode,
+            encode_key=self.encode_key,
+            decode_key=self.decode_key,
+            outer_stack=self._outer_stack,
+            immutable=self.immutable,
+            commit_every=self.commit_every,
+            commit_interval=self.commit_interval,
+            changelog=self.changelog,
+            slow_threshold=self.slow_threshold,
+            on_slow=self.on_slow,
+            explain_slow=self.explain_slow,
+            trace_sample=self.trace_sample,
+            read_priority=self.read_priority,
+            max_queue_items=self.max_queue_items,
+            max_queue_bytes=self.max_queue_bytes,
+            queue_timeout=self.queue_timeout,
+            threaded=self.threaded,
+            bloom_filter=self.bloom_filter,
+            bloom_error_rate=self.bloom_error_rate,
+            bloom_max_bytes=self.bloom_max_bytes,
+            bloom_persist=self.bloom_persist,
+            dedup=self.dedup,
+            op_timeout=self.op_timeout,
         )
+        return _unpickle_dict, (settings, self._indexes)
 
     def __enter__(self):
         if not hasattr(self, 'conn') or self.conn is None:
             self.conn = self._new_conn()
         return self
 
+    @contextmanager
+    def deadline(self, seconds):
+        """
+        Give all the operations of the calling thread inside the block, together,
+        `seconds` to complete: past that, they raise TimeoutError, as with
+        `op_timeout` (which still applies to each of them).
+
+        >>> with db.deadline(0.05):
+        ...     value = db.get(key)
+        """
+        with self.conn.deadline(seconds):
+            yield
+
     def __exit__(self, *exc_info):
         self.close()
 
@@ -270,20 +900,194 @@ class SqliteDict(DictClass):
         # Explicit better than implicit and bla bla
         return True if m is not None else False
 
+    def approx_len(self, probes=1000):
+        """
+        Estimate the number of items, without the scan of the whole table of `len()`.
+
+        If the table was analyzed (by `ANALYZE` or `PRAGMA optimize`), this is the
+        number of rows SQLite recorded then in `sqlite_stat1`: analyze it again
+        after large changes. Otherwise, it's estimated from how many of `probes`
+        random rowids, between the smallest and the largest, exist.
+        """
+        if self._has_table('sqlite_stat1'):
+            GET_STAT = 'SELECT stat FROM sqlite_stat1 WHERE tbl = ?'
+            row = self.conn.select_one(GET_STAT, (self.tablename.replace('""', '"'),))
+            if row is not None:
+                return int(row[0].split()[0])
+
+        lo, hi = self._rowid_range()
+        if lo is None:
+            return 0
+        span = hi - lo + 1
+        if span <= probes:
+            return len(self)  # counts at most `probes` rows
+        rowids = random.sample(range(lo, hi + 1), probes)
+        COUNT_ROWS = 'SELECT COUNT(*) FROM "%s" WHERE rowid IN (%%s)' % self.tablename
+        found = 0
+        for chunk in _chunked(rowids, 500):
+            found += self.conn.select_one(COUNT_ROWS % ', '.join('?' * len(chunk)), tuple(chunk))[0]
+        return max(int(round(span * found / float(probes))), 2)  # the smallest and largest rowids exist
+
+    def _rowid_range(self):
+        """The smallest and largest rowids of the table (None, None if empty)."""
+        # two subqueries: SQLite only optimizes a lone MIN() or MAX() into a B-tree lookup
+        GET_RANGE = 'SELECT (SELECT MIN(rowid) FROM "%s"), (SELECT MAX(rowid) FROM "%s")' % (
+            self.tablename, self.tablename)
+        return self.conn.select_one(GET_RANGE)
+
+    def sample(self, n, seed=None):
+        """
+        Return a list of `n` (key, value) pairs picked at random, without
+        replacement (all the items, in random order, if there are fewer).
+
+        Instead of scanning the table, random rowids between the smallest and the
+        largest one are looked up, until `n` of them are found. If the rowids are
+        too sparse for that (after many deletes or overwrites), the rowids of the
+        whole table are scanned and sampled instead. With `seed`, the same sample
+        is returned each time, as long as the table doesn't change.
+        """
+        rnd = random.Random(seed)
+        lo, hi = self._rowid_range()
+        if lo is None or n <= 0:
+            return []
+        span = hi - lo + 1
+        max_probes = 10 * n + 1000  # more than that, and the table is too sparse to keep probing
+        if span <= max_probes:
+            # few enough rowids to try them all, in random order
+            candidates = iter(rnd.sample(range(lo, hi + 1), span))
+        else:
+            candidates = iter(lambda: rnd.randint(lo, hi), None)
+
+        probed = set()
+        found = []  # (key, value) rows, in the order their rowids were drawn
+        while len(found) < n and len(probed) < min(span, max_probes):
+            # draw enough new rowids to find the missing rows, at the density seen so far
+            density = (len(found) + 1.0) / (len(probed) + 1)
+            want = min(int((n - len(found)) / density * 1.1) + 10, span - len(probed), max_probes - len(probed))
+            rowids = []
+            for rowid in candidates:
+                if rowid not in probed:
+                    probed.add(rowid)
+                    rowids.append(rowid)
+                    if len(rowids) == want:
+                        break
+            rows = self._rows_by_rowid(rowids)
+            found.extend(rows[rowid] for rowid in rowids if rowid in rows)
+
+        if len(found) < n and len(probed) < span:
+            # too sparse: reservoir sampling of all the rowids
+            reservoir = []
+            GET_ROWIDS = 'SELECT rowid FROM "%s"' % self.tablename
+            for i, (rowid,) in enumerate(row for batch in self.conn.select_batches(GET_ROWIDS) for row in batch):
+                if i < n:
+                    reservoir.append(rowid)
+                else:
+                    j = rnd.randint(0, i)
+                    if j < n:
+                        reservoir[j] = rowid
+            rnd.shuffle(reservoir)
+            rows = self._rows_by_rowid(reservoir)
+            found = [rows[rowid] for rowid in reservoir if rowid in rows]
+
+        return [(self.decode_key(key), self.decode(value)) for key, value in found[:n]]
+
+    def _rows_by_rowid(self, rowids):
+        """A dict of rowid => the (key, value) row of that rowid, for those of `rowids` that exist."""
+        GET_ROWS = 'SELECT rowid, key, value FROM "%s" WHERE rowid IN (%%s)' % self._values_table
+        rows = {}
+        for chunk in _chunked(rowids, 500):
+            for rowid, key, value in self.conn.select(GET_ROWS % ', '.join('?' * len(chunk)), tuple(chunk)):
+                rows[rowid] = (key, value)
+        return rows
+
     def iterkeys(self):
         GET_KEYS = 'SELECT key FROM "%s" ORDER BY rowid' % self.tablename
         for key in self.conn.select(GET_KEYS):
             yield self.decode_key(key[0])
 
-    def itervalues(self):
-        GET_VALUES = 'SELECT value FROM "%s" ORDER BY rowid' % self.tablename
-        for value in self.conn.select(GET_VALUES):
-            yield self.decode(value[0])
+    def itervalues(self, workers=0, pool='process', batch_size=1000):
+        """
+        Iterate over the values, in insertion order.
+
+        With `workers` > 0, the values are decoded in parallel in a pool of
+        `workers` processes (`pool='process'`, requires a picklable `decode`) or
+        threads (`pool='thread'`, only useful for a `decode` that releases the
+        GIL, e.g. decompression), in chunks of `batch_size` raw values. The values
+        still come out in order, with at most `2 * workers` chunks read and
+        decoded ahead; see `_select_pages()`.
+        """
+        GET_VALUES = 'SELECT value FROM "%s" ORDER BY rowid' % self._values_table
+        if not workers:
+            for value in self.conn.select(GET_VALUES):
+                yield self.decode(value[0])
+            return
+        decoder = functools.partial(_decode_values, self.decode)
+        chunks = self._select_pages('value', batch_size)
+        for values in _imap_chunks(decoder, chunks, workers=workers, pool=pool):
+            for value in values:
+                yield value
+
+    def iteritems(self, workers=0, pool='process', batch_size=1000):
+        """
+        Iterate over the (key, value) pairs, in insertion order.
+
+        See `itervalues()` for decoding in parallel with `workers` > 0.
+        """
+        GET_ITEMS = 'SELECT key, value FROM "%s" ORDER BY rowid' % self._values_table
+        if not workers:
+            for key, value in self.conn.select(GET_ITEMS):
+                yield self.decode_key(key), self.decode(value)
+            return
+        decoder = functools.partial(_decode_items, self.decode_key, self.decode)
+        chunks = self._select_pages('key, value', batch_size)
+        for items in _imap_chunks(decoder, chunks, workers=workers, pool=pool):
+            for item in items:
+                yield item
 
-    def iteritems(self):
-        GET_ITEMS = 'SELECT key, value FROM "%s" ORDER BY rowid' % self.tablename
-        for key, value in self.conn.select(GET_ITEMS):
-            yield self.decode_key(key), self.decode(value)
+    def iter_columns(self, batch_size=1000, decode=True, as_arrays=False):
+        """
+        Iterate over all the items in batches of up to `batch_size`, as pairs of
+        parallel lists `(keys, values)`, for vectorized processing.
+
+        The rows are fetched from SQLite and transferred from the worker thread
+        a whole batch at a time. With `decode=False`, the keys and values are
+        returned exactly as stored (typically str keys and bytes values), without
+        running `decode_key` and `decode` on them, e.g. to decode them in a
+        process pool. With `as_arrays`, each batch is a pair of 1-D NumPy arrays
+        of objects instead of lists.
+
+        Each batch is read when the previous one has been consumed, see `_select_pages()`.
+        """
+        if as_arrays and numpy is None:
+            raise ImportError('iter_columns(as_arrays=True) requires NumPy')
+        for batch in self._select_pages('key, value', batch_size):
+            keys = [key for key, _ in batch]
+            values = [value for _, value in batch]
+            if decode:
+                keys = list(map(self.decode_key, keys))
+                values = list(map(self.decode, values))
+            if as_arrays:
+                keys, values = _object_array(keys), _object_array(values)
+            yield keys, values
+
+    def _select_pages(self, columns, batch_size):
+        """
+        Iterate over lists of up to `batch_size` rows of `columns` of the table,
+        in rowid order. Each list is read by its own request, made only once the
+        previous one has been consumed, so that a large table is never read into
+        memory ahead of its consumer. The pages are not read in a single
+        transaction: the items written in the meantime may or may not be seen,
+        and an item replaced in the meantime may come out twice.
+        """
+        GET_FIRST = 'SELECT rowid, %s FROM "%s" ORDER BY rowid LIMIT ?' % (columns, self._values_table)
+        GET_NEXT = 'SELECT rowid, %s FROM "%s" WHERE rowid > ? ORDER BY rowid LIMIT ?' % (
+            columns, self._values_table)
+        page = list(self.conn.select(GET_FIRST, (batch_size,)))
+        while page:
+            yield [row[1:] for row in page]
+            if len(page) < batch_size:
+                return
+            page = list(self.conn.select(GET_NEXT, (page[-1][0], batch_size)))
 
     def keys(self):
         return self.iterkeys()
@@ -295,22 +1099,72 @@ class SqliteDict(DictClass):
         return self.iteritems()
 
     def __contains__(self, key):
+        encoded_key = self.encode_key(key)
+        if self._bloom is not None and encoded_key not in self._bloom:
+            return False
         HAS_ITEM = 'SELECT 1 FROM "%s" WHERE key = ?' % self.tablename
-        return self.conn.select_one(HAS_ITEM, (self.encode_key(key),)) is not None
+        return self.conn.select_one(HAS_ITEM, (encoded_key,)) is not None
 
     def __getitem__(self, key):
-        GET_ITEM = 'SELECT value FROM "%s" WHERE key = ?' % self.tablename
-        item = self.conn.select_one(GET_ITEM, (self.encode_key(key),))
+        encoded_key = self.encode_key(key)
+        if self._bloom is not None and encoded_key not in self._bloom:
+            raise KeyError(key)
+        GET_ITEM = 'SELECT value FROM "%s" WHERE key = ?' % self._values_table
+        item = self.conn.select_one(GET_ITEM, (encoded_key,))
         if item is None:
             raise KeyError(key)
         return self.decode(item[0])
 
+    def get_many_arrays(self, keys, out=None):
+        """
+        Fetch the arrays stored under `keys` by `encode_array`, stacked into a
+        single array: row `i` of the result is the value of `keys[i]`.
+
+        All the arrays must have the same shape. The result of shape
+        `(len(keys),) + shape` is allocated once (or pass it preallocated as
+        `out`), and each array is copied straight from the retrieved buffer into
+        its row, without decoding into intermediate arrays. Requires NumPy.
+
+        Raise KeyError if any of the keys is missing.
+        """
+        if numpy is None:
+            raise ImportError('get_many_arrays requires NumPy')
+        keys = list(keys)
+        rows = {}  # encoded key => rows of the result it goes to
+        for i, key in enumerate(keys):
+            rows.setdefault(self.encode_key(key), []).append(i)
+
+        GET_ITEMS = 'SELECT key, value FROM "%s" WHERE key IN (%%s)' % self._values_table
+        found = set()
+        for chunk in _chunked(rows, 500):
+            for key, value in self.conn.select(GET_ITEMS % ', '.join('?' * len(chunk)), tuple(chunk)):
+                dtype, shape, offset = _array_header(value)
+                if out is None:
+                    out = numpy.empty((len(keys),) + shape, dtype=dtype)
+                if shape != out.shape[1:]:
+                    raise ValueError('Array of shape %s under key %r does not fit in %s' % (
+                        shape, self.decode_key(key), out.shape))
+                arr = numpy.frombuffer(value, dtype=dtype, offset=offset).reshape(shape)
+                for i in rows[key]:
+                    out[i] = arr
+                found.add(key)
+        for key, indices in rows.items():
+            if key not in found:
+                raise KeyError(keys[indices[0]])
+        return out if out is not None else numpy.empty((0,))
+
     def __setitem__(self, key, value):
         if self.flag == 'r':
             raise RuntimeError('Refusing to write to read-only SqliteDict')
 
         ADD_ITEM = 'REPLACE INTO "%s" (key, value) VALUES (?,?)' % self.tablename
-        self.conn.execute(ADD_ITEM, (self.encode_key(key), self.encode(value)))
+        encoded_key = self.encode_key(key)
+        with self._bloom_guard([encoded_key]):
+            if self._indexes or self.changelog or self.dedup:
+                self.conn.execute_batch(self._write_statements([(encoded_key, self.encode(value))])
+                                        + self._side_writes('set', [(encoded_key, value)]))
+            else:
+                self.conn.execute(ADD_ITEM, (encoded_key, self.encode(value)))
         if self.autocommit:
             self.commit()
 
@@ -321,11 +1175,41 @@ class SqliteDict(DictClass):
         if key not in self:
             raise KeyError(key)
         DEL_ITEM = 'DELETE FROM "%s" WHERE key = ?' % self.tablename
-        self.conn.execute(DEL_ITEM, (self.encode_key(key),))
+        encoded_key = self.encode_key(key)
+        if self._indexes or self.changelog:
+            self.conn.execute_batch([(DEL_ITEM, [(encoded_key,)])] + self._side_writes('del', [(encoded_key, None)]))
+        else:
+            self.conn.execute(DEL_ITEM, (encoded_key,))
+        self._bloom_deleted()
         if self.autocommit:
             self.commit()
 
-    def update(self, items=(), **kwds):
+    def _delete_items(self, keys):
+        """Delete the `keys`, ignoring those that are missing, in a single request."""
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to delete from read-only SqliteDict')
+
+        encoded_keys = [self.encode_key(key) for key in keys]
+        DEL_ITEMS = 'DELETE FROM "%s" WHERE key = ?' % self.tablename
+        self.conn.execute_batch([(DEL_ITEMS, [(key,) for key in encoded_keys])]
+                                + self._side_writes('del', [(key, None) for key in encoded_keys]))
+        self._bloom_deleted(len(encoded_keys))
+        if self.autocommit:
+            self.commit()
+
+    def update(self, items=(), batch_size=None, encode_workers=0, pool='thread', **kwds):
+        """
+        Store all the (key, value) pairs of `items` (a dict or an iterable of pairs) and `kwds`.
+
+        By default, all the items are encoded first, then written in a single
+        request. With `batch_size`, the items are instead consumed, encoded and
+        handed over to SQLite `batch_size` at a time, so that memory use stays
+        bounded and encoding overlaps with the writes. With `encode_workers` > 0,
+        the batches (of 10000 items by default) are also encoded in parallel, in
+        a pool of threads (`pool='thread'`) or processes (`pool='process'`, requires
+        picklable `encode` and `encode_key`). Batches are separate requests, so
+        autocommit or group commit may commit between them.
+        """
         if self.flag == 'r':
             raise RuntimeError('Refusing to update read-only SqliteDict')
 
@@ -333,15 +1217,276 @@ class SqliteDict(DictClass):
             items = items.items()
         except AttributeError:
             pass
-        items = [(self.encode_key(k), self.encode(v)) for k, v in items]
-
-        UPDATE_ITEMS = 'REPLACE INTO "%s" (key, value) VALUES (?, ?)' % self.tablename
-        self.conn.executemany(UPDATE_ITEMS, items)
+        if batch_size is None and not encode_workers:
+            chunks = [list(items)]
+        else:
+            chunks = _chunked(items, batch_size or 10000)
+        if pool == 'process':
+            encoder = functools.partial(_encode_items_picklable, self.encode_key, self.encode)
+        else:
+            encoder = functools.partial(_encode_items, self.encode_key, self.encode)
+
+        # the original values are needed to update the secondary indexes, keep them around
+        raw_chunks = deque()
+
+        def read_chunks():
+            for chunk in chunks:
+                if self._indexes or self.changelog:
+                    raw_chunks.append(chunk)
+                yield chunk
+
+        written = deque()  # for each batch in flight, a queue that receives --no more-- once it's written
+        deadline = self.conn._deadline()  # the whole update is a single operation
+        for batch in _imap_chunks(encoder, read_chunks(), workers=encode_workers, pool=pool):
+            side_writes = []
+            if self._indexes or self.changelog:
+                side_writes = self._side_writes(
+                    'set', [(key, value) for (key, _), (_, value) in zip(batch, raw_chunks.popleft())])
+            written.append(Queue())
+            with self._bloom_guard([key for key, _ in batch]):
+                self.conn.execute_batch(self._write_statements(batch) + side_writes, res=written[-1])
+            if len(written) > 2:
+                # don't let encoded batches pile up in the request queue, if SQLite can't keep up
+                try:
+                    written.popleft().get(timeout=None if deadline is None else max(0, deadline - time.time()))
+                except Empty:
+                    raise TimeoutError('SqliteDict operation timed out')
         if kwds:
             self.update(kwds)
         if self.autocommit:
             self.commit()
 
+    def _atomically(self, fn, *args):
+        """
+        Call `fn(conn, *args)` in the worker thread, atomically: no other operation
+        runs in between its statements, and they are all rolled back if it raises.
+        Return its result.
+        """
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to write to read-only SqliteDict')
+        result = self.conn.call(fn, *args)
+        if self.autocommit:
+            self.commit()
+        return result
+
+    def _write_now(self, conn, op, encoded_key, value=None):
+        """Inside `_atomically`: write (op='set') or delete (op='del') a single item."""
+        if op == 'set':
+            statements = self._write_statements([(encoded_key, self.encode(value))])
+        else:
+            statements = [('DELETE FROM "%s" WHERE key = ?' % self.tablename, [(encoded_key,)])]
+        for statement, items in statements + self._side_writes(op, [(encoded_key, value)]):
+            conn.executemany(statement, items)
+
+    def _read_now(self, conn, encoded_key):
+        """Inside `_atomically`: return the decoded value of a single item, or `_MISSING`."""
+        GET_ITEM = 'SELECT value FROM "%s" WHERE key = ?' % self._values_table
+        row = conn.execute(GET_ITEM, (encoded_key,)).fetchone()
+        return _MISSING if row is None else self.decode(row[0])
+
+    def setdefault(self, key, default=None):
+        """Return the value of `key`; if it's missing, store and return `default`. Atomic."""
+        def setdefault(conn, encoded_key):
+            value = self._read_now(conn, encoded_key)
+            if value is _MISSING:
+                self._write_now(conn, 'set', encoded_key, default)
+                return default
+            return value
+        encoded_key = self.encode_key(key)
+        with self._bloom_guard([encoded_key]):
+            return self._atomically(setdefault, encoded_key)
+
+    def pop(self, key, default=_MISSING):
+        """
+        Delete `key` and return its value. If it's missing, return `default`, or
+        raise KeyError if not given. Atomic.
+        """
+        def pop(conn, encoded_key):
+            value = self._read_now(conn, encoded_key)
+            if value is not _MISSING:
+                self._write_now(conn, 'del', encoded_key)
+            return value
+        value = self._atomically(pop, self.encode_key(key))
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        self._bloom_deleted()
+        return value
+
+    def popitem(self):
+        """Delete the first (oldest) item and return it as a (key, value) pair. Atomic."""
+        def popitem(conn):
+            GET_FIRST = 'SELECT key, value FROM "%s" ORDER BY rowid LIMIT 1' % self._values_table
+            row = conn.execute(GET_FIRST).fetchone()
+            if row is None:
+                return _MISSING
+            self._write_now(conn, 'del', row[0])
+            return self.decode_key(row[0]), self.decode(row[1])
+        item = self._atomically(popitem)
+        if item is _MISSING:
+            raise KeyError('popitem(): dictionary is empty')
+        self._bloom_deleted()
+        return item
+
+    def get_and_set(self, key, value, default=None):
+        """Store `value` under `key`, and return the previous value (`default` if none). Atomic."""
+        def get_and_set(conn, encoded_key):
+            old_value = self._read_now(conn, encoded_key)
+            self._write_now(conn, 'set', encoded_key, value)
+            return default if old_value is _MISSING else old_value
+        encoded_key = self.encode_key(key)
+        with self._bloom_guard([encoded_key]):
+            return self._atomically(get_and_set, encoded_key)
+
+    def update_value(self, key, fn, default=None):
+        """
+        Replace the value of `key` by `fn(value)` (`fn(default)` if missing), and
+        return the new value.
+
+        This is atomic: `fn` runs in the worker thread, in between the read and
+        the write, so that no concurrent change can get lost. Keep it quick, all
+        other operations wait for it.
+        """
+        def update_value(conn, encoded_key):
+            value = self._read_now(conn, encoded_key)
+            value = fn(default if value is _MISSING else value)
+            self._write_now(conn, 'set', encoded_key, value)
+            return value
+        encoded_key = self.encode_key(key)
+        with self._bloom_guard([encoded_key]):
+            return self._atomically(update_value, encoded_key)
+
+    def incr(self, key, delta=1):
+        """
+        Add `delta` to the integer value of `key` (starting from 0 if missing), and
+        return the new value. Atomic.
+
+        With `encode` and `decode` set to `identity`, so that the numbers are
+        stored as they are, the addition runs in SQL (an upsert); otherwise the
+        value is decoded, incremented and encoded again, in the worker thread.
+        """
+        if self.encode is not identity or self.decode is not identity or self.dedup:
+            return self.update_value(key, lambda value: value + delta, default=0)
+
+        def incr(conn, encoded_key):
+            UPSERT = (
+                'INSERT INTO "%s" (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = value + excluded.value'
+            ) % self.tablename
+            conn.execute(UPSERT, (encoded_key, delta))
+            value = self._read_now(conn, encoded_key)
+            for statement, items in self._side_writes('set', [(encoded_key, value)]):
+                conn.executemany(statement, items)
+            return value
+        encoded_key = self.encode_key(key)
+        with self._bloom_guard([encoded_key]):
+            return self._atomically(incr, encoded_key)
+
+    # pragmas in effect for the duration of bulk_load(): a 256MB page cache, temp tables in RAM
+    BULK_LOAD_PRAGMAS = [('cache_size', -256 * 1024), ('temp_store', 2)]
+
+    def bulk_load(self, items, batch_size=10000, sort=True, workers=0, pool='thread', progress=None):
+        """
+        Insert a large number of (key, value) pairs, much faster than `update()`.
+
+        `items` can be a dict or any iterable of (key, value) pairs, including
+        a generator: it is consumed lazily, `batch_size` items at a time, so the
+        whole input never has to fit in memory.
+
+        With `workers` > 0, the batches are encoded in parallel in a pool of
+        `workers` threads (`pool='thread'`) or processes (`pool='process'`),
+        overlapping with the SQLite writes. A process pool requires picklable
+        `encode` and `encode_key` functions.
+
+        With `sort`, each batch is sorted by key before insertion, for better
+        B-tree locality.
+
+        Each batch is committed as one transaction, and `progress(count)` is
+        called after each commit with the number of items loaded so far.
+        `BULK_LOAD_PRAGMAS` are applied for the duration of the load.
+
+        Returns the number of items loaded.
+        """
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to bulk load into read-only SqliteDict')
+
+        if hasattr(items, 'items'):
+            items = items.items()
+        if pool == 'process':
+            encoder = functools.partial(_encode_items_picklable, self.encode_key, self.encode)
+        else:
+            encoder = functools.partial(_encode_items, self.encode_key, self.encode)
+
+        # the original values are needed to update the secondary indexes, keep them around
+        raw_chunks = deque()
+
+        def chunks():
+            for chunk in _chunked(items, batch_size):
+                raw_chunks.append(chunk)
+                yield chunk
+
+        old_pragmas = [
+            (name, self.conn.select_one('PRAGMA %s' % name)[0]) for name, _ in self.BULK_LOAD_PRAGMAS
+        ]
+        count = 0
+        try:
+            for name, value in self.BULK_LOAD_PRAGMAS:
+                self.conn.execute('PRAGMA %s = %s' % (name, value))
+            for batch in _imap_chunks(encoder, chunks(), workers=workers, pool=pool):
+                raw_chunk = raw_chunks.popleft()
+                side_writes = []
+                if self._indexes or self.changelog:
+                    side_writes = self._side_writes(
+                        'set', [(key, value) for (key, _), (_, value) in zip(batch, raw_chunk)])
+                if sort:
+                    batch.sort(key=lambda item: _key_order(item[0]))
+                with self._bloom_guard([key for key, _ in batch]):
+                    self.conn.execute_batch(self._write_statements(batch) + side_writes)
+                self.commit()
+                count += len(batch)
+                if progress is not None:
+                    progress(count)
+        finally:
+            for name, value in old_pragmas:
+                self.conn.execute('PRAGMA %s = %s' % (name, value))
+        return count
+
+    def export(self, dest, format='jsonl', progress=None, progress_every=10000):
+        """
+        Stream all (key, value) pairs into the file `dest` (a filename or a file object).
+
+        `format` is either 'jsonl', one JSON object `{"key": ..., "value": ...}`
+        per line (keys and values must be JSON-serializable), or 'pickle', a
+        stream of pickled (key, value) tuples. Use `read_export()` to read the
+        pairs back.
+
+        `progress(count)` is called every `progress_every` items, with the
+        number of items exported so far.
+
+        Returns the number of items exported.
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError('Unrecognized export format: %s' % format)
+
+        if isinstance(dest, str):
+            mode = 'w' if format == 'jsonl' else 'wb'
+            with io.open(dest, mode, encoding='utf8' if format == 'jsonl' else None) as fout:
+                return self.export(fout, format=format, progress=progress, progress_every=progress_every)
+
+        count = 0
+        for key, value in self.iteritems():
+            if format == 'jsonl':
+                dest.write(json.dumps({'key': key, 'value': value}) + '\n')
+            else:
+                dump((key, value), dest, protocol=PICKLE_PROTOCOL)
+            count += 1
+            if progress is not None and count % progress_every == 0:
+                progress(count)
+        if progress is not None and count % progress_every:
+            progress(count)
+        return count
+
     def __iter__(self):
         return self.iterkeys()
 
@@ -349,24 +1494,625 @@ class SqliteDict(DictClass):
         if self.flag == 'r':
             raise RuntimeError('Refusing to clear read-only SqliteDict')
 
-        # avoid VACUUM, as it gives "OperationalError: database schema has changed"
-        CLEAR_ALL = 'DELETE FROM "%s";' % self.tablename
         self.conn.commit()
-        self.conn.execute(CLEAR_ALL)
+        with self._bloom_lock:
+            if self._bloom is not None:
+                self._bloom = self._new_bloom(0)
+            self.conn.execute_batch(self._clear_statements())
         self.conn.commit()
 
+    def _clear_statements(self):
+        """The statements deleting all the items, along with their entries in the side tables."""
+        # avoid VACUUM, as it gives "OperationalError: database schema has changed"
+        statements = []
+        if self.dedup:
+            # first, so that the triggers on the table find no reference counts left to update
+            statements.append(('DELETE FROM "%s__content"' % self.tablename, [()]))
+        statements.append(('DELETE FROM "%s"' % self.tablename, [()]))
+        if self._has_table('%s__index' % self.tablename):
+            statements.append(('DELETE FROM "%s__index"' % self.tablename, [()]))
+        if self.changelog:
+            statements.append(self._log_changes('clear', [None]))
+        return statements
+
+    def _has_table(self, name):
+        """Does the table `name` (already escaped, like self.tablename) exist in the database?"""
+        GET_TABLE = 'SELECT name FROM sqlite_master WHERE type = "table" AND name = ?'
+        name = name.replace('""', '"')
+        for batch in self.conn.select_batches(GET_TABLE, (name,), batch_size=1):
+            return batch == [(name,)]
+        return False
+
+    def _check_dedup(self):
+        """Refuse to open a table with a different `dedup` than it was created with."""
+        has_content = self._has_table('%s__content' % self.tablename)
+        if self.dedup and not has_content:
+            HAS_ROWS = 'SELECT 1 FROM "%s" LIMIT 1' % self.tablename
+            if self.flag == 'r' or self.conn.select_one(HAS_ROWS) is not None:
+                raise RuntimeError('Table "%s" was not created with dedup=True' % self.tablename)
+        if not self.dedup and has_content:
+            # its values are hashes of the content, and writes must maintain the reference counts
+            raise RuntimeError('Table "%s" was created with dedup=True, open it with dedup=True' % self.tablename)
+
+    def _make_content_table(self):
+        """Create the content table of `dedup`, the view of the values, and the triggers counting references."""
+        MAKE_CONTENT = (
+            'CREATE TABLE IF NOT EXISTS "%s__content" (hash BLOB PRIMARY KEY, value BLOB, refs INTEGER NOT NULL)'
+        ) % self.tablename
+        MAKE_VIEW = (
+            'CREATE VIEW IF NOT EXISTS "%s__values" AS SELECT t.rowid AS rowid, t.key AS key, c.value AS value '
+            'FROM "%s" AS t JOIN "%s__content" AS c ON c.hash = t.value'
+        ) % (self.tablename, self.tablename, self.tablename)
+        INCREF = 'UPDATE "%s__content" SET refs = refs + 1 WHERE hash = NEW.value;' % self.tablename
+        DECREF = 'UPDATE "%s__content" SET refs = refs - 1 WHERE hash = OLD.value;' % self.tablename
+        self.conn.execute(MAKE_CONTENT)
+        self.conn.execute(MAKE_VIEW)
+        for name, event, body in [('insert', 'INSERT', INCREF), ('delete', 'DELETE', DECREF),
+                                  ('update', 'UPDATE OF value', DECREF + ' ' + INCREF)]:
+            MAKE_TRIGGER = 'CREATE TRIGGER IF NOT EXISTS "%s__content_%s" AFTER %s ON "%s" BEGIN %s END' % (
+                self.tablename, name, event, self.tablename, body)
+            self.conn.execute(MAKE_TRIGGER)
+
+    def _write_statements(self, items):
+        """The statements storing the (encoded key, encoded value) pairs `items`."""
+        if not self.dedup:
+            return [('REPLACE INTO "%s" (key, value) VALUES (?, ?)' % self.tablename, items)]
+        hashes = [(key, _content_hash(value)) for key, value in items]
+        ADD_CONTENT = 'INSERT OR IGNORE INTO "%s__content" (hash, value, refs) VALUES (?, ?, 0)' % self.tablename
+        # an upsert rather than REPLACE, whose implicit delete wouldn't fire the trigger decrementing the old value
+        ADD_ITEMS = (
+            'INSERT INTO "%s" (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value'
+        ) % self.tablename
+        return [
+            (ADD_CONTENT, [(h, value) for (_, h), (_, value) in zip(hashes, items)]),
+            (ADD_ITEMS, hashes),
+        ]
+
+    def collect_garbage(self, recount=False):
+        """
+        Delete the values that no key refers to anymore from the content table of
+        a `dedup` SqliteDict, and return how many were deleted.
+
+        With `recount`, the reference counts are first recomputed from the table
+        (which takes a full scan), in case they went wrong, e.g. because the
+        table was written to by something else than a `dedup` SqliteDict.
+        """
+        if not self.dedup:
+            raise RuntimeError('Garbage collection requires dedup=True')
+
+        def collect_garbage(conn):
+            if recount:
+                conn.execute('UPDATE "%s__content" SET refs = 0' % self.tablename)
+                COUNT_REFS = 'SELECT value, COUNT(*) FROM "%s" GROUP BY value' % self.tablename
+                SET_REFS = 'UPDATE "%s__content" SET refs = ? WHERE hash = ?' % self.tablename
+                conn.executemany(SET_REFS, [(refs, h) for h, refs in conn.execute(COUNT_REFS).fetchall()])
+            return conn.execute('DELETE FROM "%s__content" WHERE refs <= 0' % self.tablename).rowcount
+        return self._atomically(collect_garbage)
+
+    # fraction of the keys of the Bloom filter whose deletion triggers its rebuild
+    BLOOM_REBUILD_DELETES = 0.25
+
+    def _new_bloom(self, num_keys):
+        """An empty Bloom filter, with room for `num_keys` keys and as many new ones."""
+        return _BloomFilter(max(2 * num_keys, 1024), self.bloom_error_rate, self.bloom_max_bytes)
+
+    @contextmanager
+    def _bloom_guard(self, encoded_keys):
+        """
+        Add `encoded_keys` to the Bloom filter, and keep it locked while the block
+        queues up their writes, so that a concurrent `rebuild_bloom()` can't miss them.
+        """
+        if self._bloom is None:
+            yield
+            return
+        with self._bloom_lock:
+            for bloom in (self._bloom, self._bloom_next):
+                if bloom is not None:
+                    bloom.add(encoded_keys)
+            yield
+        if self._bloom.count > self._bloom.capacity:
+            self._rebuild_bloom_once()
+
+    def _bloom_deleted(self, count=1):
+        """Record the deletion of `count` keys, which stay in the Bloom filter."""
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.deleted += count
+            if bloom.deleted > self.BLOOM_REBUILD_DELETES * bloom.capacity / 2:
+                self._rebuild_bloom_once()
+
+    def _rebuild_bloom_once(self):
+        if self._bloom_next is None:
+            self.rebuild_bloom()
+
+    def rebuild_bloom(self):
+        """
+        Rebuild the Bloom filter (see `bloom_filter`) from the keys currently in
+        the table, e.g. after it was written to by someone else. Writes may go on
+        in the meantime.
+        """
+        if not self.bloom_filter:
+            raise RuntimeError('Rebuilding the Bloom filter requires bloom_filter=True')
+        bloom = self._new_bloom(len(self))
+        with self._bloom_lock:
+            if self._bloom_next is not None:
+                return  # another thread is already at it
+            self._bloom_next = bloom  # from now on, new keys go into the new filter too
+        try:
+            if self.flag != 'r':
+                # wait for the writes queued before, whose keys didn't go into the new filter
+                self.conn.call(lambda conn: None)
+            GET_KEYS = 'SELECT key FROM "%s"' % self.tablename
+            for batch in self.conn.select_batches(GET_KEYS, batch_size=10000):
+                with self._bloom_lock:
+                    bloom.add(key for key, in batch)
+            with self._bloom_lock:
+                self._bloom = bloom
+        finally:
+            self._bloom_next = None
+
+    def _make_bloom_table(self):
+        """Create the table of the persisted Bloom filter, and the triggers that flag it as out of date."""
+        MAKE_BLOOM = (
+            'CREATE TABLE IF NOT EXISTS "%s__bloom" (id INTEGER PRIMARY KEY CHECK (id = 0), bits BLOB, '
+            'num_hashes INTEGER, capacity INTEGER, error_rate REAL, count INTEGER, deleted INTEGER, dirty INTEGER)'
+        ) % self.tablename
+        self.conn.execute(MAKE_BLOOM)
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            MAKE_TRIGGER = (
+                'CREATE TRIGGER IF NOT EXISTS "%s__bloom_%s" AFTER %s ON "%s" '
+                'BEGIN UPDATE "%s__bloom" SET dirty = 1 WHERE dirty = 0; END'
+            ) % (self.tablename, event.lower(), event, self.tablename, self.tablename)
+            self.conn.execute(MAKE_TRIGGER)
+
+    def _open_bloom(self):
+        """Load the persisted Bloom filter if it's up to date, build it from the keys otherwise."""
+        if self.bloom_persist and self._has_table('%s__bloom' % self.tablename):
+            GET_BLOOM = (
+                'SELECT bits, num_hashes, capacity, error_rate, count, deleted FROM "%s__bloom" '
+                'WHERE id = 0 AND dirty = 0'
+            ) % self.tablename
+            row = self.conn.select_one(GET_BLOOM)
+            if row is not None:
+                bits, num_hashes, capacity, error_rate, count, deleted = row
+                if error_rate == self.bloom_error_rate and (
+                        self.bloom_max_bytes is None or len(bits) <= self.bloom_max_bytes):
+                    self._bloom = _BloomFilter(capacity, error_rate, bits=bits, num_hashes=num_hashes)
+                    self._bloom.count, self._bloom.deleted = count, deleted
+                    return
+        self.rebuild_bloom()
+
+    def _save_bloom(self):
+        """Persist the Bloom filter, once the connection is closed; see `bloom_persist`."""
+        if self.flag == 'r' or self.in_temp or self.filename == ':memory:':
+            return
+        bloom = self._bloom
+        # Whatever was rolled back on close is still in the filter, which is harmless:
+        # all the keys in the table are in it, and that's what matters.
+        SAVE_BLOOM = 'REPLACE INTO "%s__bloom" VALUES (0, ?, ?, ?, ?, ?, ?, 0)' % self.tablename
+        try:
+            conn = sqlite3.connect(self.filename)
+            try:
+                with conn:
+                    conn.execute(SAVE_BLOOM, (bytes(bloom.bits), bloom.num_hashes, bloom.capacity,
+                                              bloom.error_rate, bloom.count, bloom.deleted))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            logger.exception('failed to save the Bloom filter of %s', self)
+
+    def add_index(self, name, extractor, rebuild=False):
+        """
+        Maintain a secondary index `name` over the values, for fast lookups with
+        `find()` and `find_range()`.
+
+        `extractor` is a function that takes a value and returns the field to index:
+        an int, float, str or bytes, or None to leave the value out of the index.
+        It is called on every value stored through `__setitem__`, `update` and
+        `bulk_load`; the extracted fields live in the side table
+        `<tablename>__index` of the same database, and are kept consistent on
+        deletes and `clear`.
+
+        Extractors cannot be stored in the database, so `add_index` must be called
+        again each time the SqliteDict is opened. An index that has no entries
+        yet is built by scanning the whole table. Writes that happen while an
+        index is not registered (e.g. from another SqliteDict) make it stale;
+        pass `rebuild=True` to rebuild it from scratch.
+        """
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to create an index in read-only SqliteDict')
+
+        INDEX_TABLE = '%s__index' % self.tablename
+        self.conn.execute('CREATE TABLE IF NOT EXISTS "%s" (name TEXT, value, key TEXT)' % INDEX_TABLE)
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS "%s_value" ON "%s" (name, value)' % (INDEX_TABLE, INDEX_TABLE))
+        self.conn.execute('CREATE INDEX IF NOT EXISTS "%s_key" ON "%s" (key)' % (INDEX_TABLE, INDEX_TABLE))
+
+        HAS_ENTRIES = 'SELECT 1 FROM "%s" WHERE name = ? LIMIT 1' % INDEX_TABLE
+        build = rebuild or self.conn.select_one(HAS_ENTRIES, (name,)) is None
+        self._indexes[name] = extractor
+        if build:
+            self.conn.execute('DELETE FROM "%s" WHERE name = ?' % INDEX_TABLE, (name,))
+            GET_ITEMS = 'SELECT key, value FROM "%s" ORDER BY rowid' % self._values_table
+            ADD_ENTRIES = 'INSERT INTO "%s" (name, value, key) VALUES (?, ?, ?)' % INDEX_TABLE
+            for chunk in _chunked(self.conn.select(GET_ITEMS), 10000):
+                entries = [(name, extractor(self.decode(value)), key) for key, value in chunk]
+                self.conn.executemany(ADD_ENTRIES, [entry for entry in entries if entry[1] is not None])
+        self.commit()
+
+    def drop_index(self, name):
+        """Stop maintaining the secondary index `name`, and delete its entries."""
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to drop an index in read-only SqliteDict')
+        if self._indexes.pop(name, None) is None:
+            raise KeyError(name)
+        self.conn.execute('DELETE FROM "%s__index" WHERE name = ?' % self.tablename, (name,))
+        self.commit()
+
+    def _side_writes(self, op, items):
+        """
+        The statements that must accompany the write `op` ('set' or 'del') of
+        the (encoded key, value) pairs `items`, in the same transaction:
+        updates of the secondary indexes and of the changelog.
+        """
+        statements = []
+        if self._indexes:
+            statements.extend(self._reindex(items, delete=op == 'del'))
+        if self.changelog:
+            statements.append(self._log_changes(op, [key for key, _ in items]))
+        return statements
+
+    def _reindex(self, items, delete=False):
+        """Statements updating the secondary indexes for the (encoded key, value) pairs `items`."""
+        INDEX_TABLE = '%s__index' % self.tablename
+        DEL_ENTRIES = 'DELETE FROM "%s" WHERE key = ?' % INDEX_TABLE
+        statements = [(DEL_ENTRIES, [(key,) for key, _ in items])]
+        if delete:
+            return statements
+
+        entries = []
+        for key, value in items:
+            for name, extractor in self._indexes.items():
+                field = extractor(value)
+                if field is not None:
+                    entries.append((name, field, key))
+        ADD_ENTRIES = 'INSERT INTO "%s" (name, value, key) VALUES (?, ?, ?)' % INDEX_TABLE
+        statements.append((ADD_ENTRIES, entries))
+        return statements
+
+    def _log_changes(self, op, keys):
+        """Statement appending the operation `op` on the encoded `keys` to the changelog."""
+        LOG_CHANGES = 'INSERT INTO "%s__changelog" (op, key) VALUES (?, ?)' % self.tablename
+        return (LOG_CHANGES, [(op, key) for key in keys])
+
+    def changes_since(self, seq=0, limit=None):
+        """
+        Iterate over the changes recorded after the sequence number `seq`, as
+        `(seq, op, key)` tuples in the order they happened, at most `limit` of them.
+
+        `op` is 'set' for a key written by `__setitem__`, `update` or
+        `bulk_load`, 'del' for a deleted key, and 'clear' for `clear()` (with
+        the key None). Pass the last `seq` seen to the next call to get only
+        newer changes. Requires `changelog=True`.
+        """
+        GET_CHANGES = 'SELECT seq, op, key FROM "%s__changelog" WHERE seq > ? ORDER BY seq' % self.tablename
+        if limit is not None:
+            GET_CHANGES += ' LIMIT %d' % limit
+        for seq, op, key in self.conn.select(GET_CHANGES, (seq,)):
+            yield seq, op, (None if key is None else self.decode_key(key))
+
+    def last_change_seq(self):
+        """The sequence number of the latest change recorded in the changelog (0 if none)."""
+        GET_SEQ = 'SELECT seq FROM sqlite_sequence WHERE name = ?'
+        row = self.conn.select_one(GET_SEQ, ('%s__changelog' % self.tablename.replace('""', '"'),))
+        return row[0] if row is not None else 0
+
+    def truncate_changes(self, seq=None, keep=None):
+        """
+        Delete old entries from the changelog: those with a sequence number up
+        to and including `seq`, and/or all but the latest `keep` entries.
+
+        Consumers that have not seen the deleted entries yet cannot catch up
+        incrementally any more. Sequence numbers are never reused.
+        """
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to truncate the changelog of read-only SqliteDict')
+        if seq is not None:
+            self.conn.execute('DELETE FROM "%s__changelog" WHERE seq <= ?' % self.tablename, (seq,))
+        if keep is not None:
+            self.conn.execute('DELETE FROM "%s__changelog" WHERE seq <= ?' % self.tablename,
+                              (self.last_change_seq() - keep,))
+        if self.autocommit:
+            self.commit()
+
+    def sync_to(self, other, batch_size=10000):
+        """
+        Bring a follower replica of this table up to date, copying only what
+        changed since its previous sync. Requires `changelog=True`.
+
+        `other` is the filename of the follower database, or a SqliteDict
+        opened on it. The follower table has the same name and must use the
+        same encoding; the values are copied without decoding them.
+
+        The follower remembers (in its side table `<tablename>__sync`) up to
+        which changelog entry of this leader it has been synced. The next sync
+        applies only the changes recorded after that: new values of the keys
+        set since, and deletions. The changes are applied in transactions of
+        up to `batch_size` changelog entries, each one also advancing the
+        remembered position, so an interrupted sync resumes where it stopped,
+        and readers of the follower always see a consistent state (use
+        `journal_mode='WAL'` on the follower so that they are never blocked).
+
+        The first sync of a follower, or one whose changes have already been
+        truncated from the changelog, copies the whole table instead (in a
+        single transaction).
+
+        Returns the sequence number of the last change applied.
+        """
+        if isinstance(other, SqliteDict):
+            return self._sync_into(other, batch_size)
+        with SqliteDict(other, tablename=self.tablename.replace('""', '"'), encode=self.encode,
+                        decode=self.decode, encode_key=self.encode_key, decode_key=self.decode_key) as follower:
+            return self._sync_into(follower, batch_size)
+
+    def sync_from(self, source, batch_size=10000):
+        """
+        Bring this table up to date with the leader `source` (a filename, or a
+        SqliteDict with `changelog=True`). See `sync_to()`.
+        """
+        if isinstance(source, SqliteDict):
+            return source._sync_into(self, batch_size)
+        with SqliteDict(source, tablename=self.tablename.replace('""', '"'), flag='r',
+                        encode=self.encode, decode=self.decode) as leader:
+            return leader._sync_into(self, batch_size)
+
+    def _sync_into(self, follower, batch_size):
+        if follower.flag == 'r':
+            raise RuntimeError('Refusing to sync into read-only SqliteDict')
+        if not self._has_table('%s__changelog' % self.tablename):
+            raise RuntimeError('Syncing requires a leader with changelog=True')
+        if self.flag != 'r':
+            self.commit()  # never ship changes that may still be rolled back
+
+        source = '%s:%s' % (os.path.abspath(self.filename), self.tablename)
+        SYNC_TABLE = '%s__sync' % follower.tablename
+        follower.conn.execute('CREATE TABLE IF NOT EXISTS "%s" (source TEXT PRIMARY KEY, seq INTEGER)' % SYNC_TABLE)
+        row = follower.conn.select_one('SELECT seq FROM "%s" WHERE source = ?' % SYNC_TABLE, (source,))
+        synced = row[0] if row is not None else None
+        SET_SYNCED = 'REPLACE INTO "%s" (source, seq) VALUES (?, ?)' % SYNC_TABLE
+
+        last = self.last_change_seq()
+        first = self.conn.select_one('SELECT MIN(seq) FROM "%s__changelog"' % self.tablename)[0]
+        if synced is not None and synced <= last and (synced == last or (first is not None and first <= synced + 1)):
+            # incremental: apply the changelog entries since the previous sync, batch by batch
+            GET_CHANGES = 'SELECT seq, op, key FROM "%s__changelog" WHERE seq > ? ORDER BY seq' % self.tablename
+            for changes in _chunked(self.conn.select(GET_CHANGES, (synced,)), batch_size):
+                statements = self._sync_statements(follower, changes)
+                synced = changes[-1][0]
+                with follower._bloom_guard([key for _, op, key in changes if op != 'clear']):
+                    follower.conn.execute_batch(statements + [(SET_SYNCED, [(source, synced)])])
+                follower.commit()
+            return synced
+
+        # full copy: replace the whole follower table
+        statements = follower._clear_statements()
+        with follower.transaction():
+            follower.conn.execute_batch(statements)
+            GET_ITEMS = 'SELECT key, value FROM "%s" ORDER BY rowid' % self._values_table
+            for items in _chunked(self.conn.select(GET_ITEMS), batch_size):
+                with follower._bloom_guard([key for key, _ in items]):
+                    follower.conn.execute_batch(self._sync_writes(follower, items))
+            follower.conn.execute_batch([(SET_SYNCED, [(source, last)])])
+        return last
+
+    def _sync_statements(self, follower, changes):
+        """The follower statements applying a batch of changelog entries."""
+        statements = []
+        keys = {}  # encoded key => last operation on it, since the latest clear
+        for _, op, key in changes:
+            if op == 'clear':
+                keys.clear()
+                statements = follower._clear_statements()
+            else:
+                keys[key] = op
+
+        # fetch the current values of the keys that were set; those gone since count as deleted
+        GET_ITEMS = 'SELECT key, value FROM "%s" WHERE key IN (%%s)' % self._values_table
+        set_keys = [key for key, op in keys.items() if op == 'set']
+        items = []
+        for chunk in _chunked(set_keys, 500):
+            items.extend(self.conn.select(GET_ITEMS % ', '.join('?' * len(chunk)), tuple(chunk)))
+        found = set(key for key, _ in items)
+        deleted = [(key, None) for key in keys if key not in found]
+
+        if deleted:
+            statements.append(('DELETE FROM "%s" WHERE key = ?' % follower.tablename, [(key,) for key, _ in deleted]))
+            statements.extend(follower._side_writes('del', deleted))
+        if items:
+            statements.extend(self._sync_writes(follower, items))
+        return statements
+
+    def _sync_writes(self, follower, items):
+        """The follower statements writing the (encoded key, encoded value) pairs `items`."""
+        statements = follower._write_statements(items)
+        if follower._indexes or follower.changelog:
+            decode = follower.decode if follower._indexes else identity
+            statements.extend(follower._side_writes('set', [(key, decode(value)) for key, value in items]))
+        return statements
+
+    def find(self, name, value):
+        """
+        Iterate over the (key, value) pairs whose field extracted by the index
+        `name` equals `value`, using the index instead of scanning the table.
+        """
+        return self._find(name, 'i.value = ?', (value,))
+
+    def find_range(self, name, lo=None, hi=None):
+        """
+        Iterate over the (key, value) pairs whose field extracted by the index `name`
+        lies between `lo` and `hi` (inclusive, None means unbounded), ordered by that field.
+        """
+        conditions, args = [], []
+        if lo is not None:
+            conditions.append('i.value >= ?')
+            args.append(lo)
+        if hi is not None:
+            conditions.append('i.value <= ?')
+            args.append(hi)
+        return self._find(name, ' AND '.join(conditions) or '1', tuple(args), order_by='i.value')
+
+    def _find(self, name, condition, args, order_by='t.rowid'):
+        if name not in self._indexes:
+            raise KeyError(name)
+        FIND_ITEMS = (
+            'SELECT t.key, t.value FROM "%s__index" AS i JOIN "%s" AS t ON t.key = i.key '
+            'WHERE i.name = ? AND %s ORDER BY %s'
+        ) % (self.tablename, self._values_table, condition, order_by)
+        rows = self.conn.select(FIND_ITEMS, (name,) + args)
+        return ((self.decode_key(key), self.decode(value)) for key, value in rows)
+
+    # comparison operators accepted by query()
+    QUERY_OPERATORS = ['=', '!=', '<', '<=', '>', '>=']
+
+    def _check_json(self):
+        if self.encode is not json.dumps or self.decode is not json.loads:
+            raise RuntimeError('JSON queries require encode=json.dumps and decode=json.loads')
+
+    def query(self, where=None, fields=None, limit=None):
+        """
+        Iterate over the (key, value) pairs whose values match `where`, filtering
+        inside SQLite with its JSON functions, without decoding the other values.
+
+        Only available for tables with JSON values, i.e. opened with
+        `encode=json.dumps, decode=json.loads`.
+
+        `where` maps fields to the values they must be equal to, or to an
+        `(operator, value)` tuple, with the operator one of `QUERY_OPERATORS`.
+        All conditions must hold. A field is either a dotted path of object
+        keys like `'user.id'` (without double quotes, ValueError otherwise), or
+        a full SQLite JSON path like `'$.tags[0]'`.
+        Comparing to None matches missing fields and JSON nulls. Note that
+        SQLite sees JSON `true`/`false` as 1/0.
+
+        With `fields`, only those fields are fetched: the value in each
+        returned pair is a dict mapping each of `fields` to its value (None
+        if missing).
+
+        At most `limit` pairs are returned, if given.
+
+        Use `add_json_index()` to make the filtering on a field use an index.
+        """
+        self._check_json()
+
+        conditions, args = [], []
+        for field, condition in (where or {}).items():
+            op, value = condition if isinstance(condition, tuple) else ('=', condition)
+            if op not in self.QUERY_OPERATORS:
+                raise ValueError('Unrecognized query operator: %s' % op)
+            if value is None and op in ('=', '!='):
+                conditions.append('%s IS %sNULL' % (self._json_field(field), 'NOT ' if op == '!=' else ''))
+            else:
+                conditions.append('%s %s ?' % (self._json_field(field), op))
+                args.append(value)
+
+        if fields:
+            fields = list(fields)
+            # json_extract() returns JSON text when given multiple paths, a plain SQL value otherwise;
+            # always ask for at least two to get JSON, which preserves types such as true/false
+            paths = [self._json_path(field) for field in fields + fields[:1]]
+            projection = 'json_extract(value, %s)' % ', '.join(paths)
+        else:
+            projection = 'value'
+
+        QUERY = 'SELECT key, %s FROM "%s" WHERE %s ORDER BY rowid' % (
+            projection, self._values_table, ' AND '.join(conditions) or '1')
+        if limit is not None:
+            QUERY += ' LIMIT %d' % limit
+
+        for key, value in self.conn.select(QUERY, tuple(args)):
+            value = json.loads(value)
+            if fields:
+                value = dict(zip(fields, value))
+            yield self.decode_key(key), value
+
+    def add_json_index(self, field):
+        """
+        Create an SQLite expression index on the JSON `field` of the values,
+        so that `query()` conditions on that field don't scan the whole table.
+        See `query()` for the `field` syntax.
+        """
+        self._check_json()
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to create an index in read-only SqliteDict')
+        if self.dedup:
+            raise RuntimeError('JSON indexes are not available with dedup=True')
+        MAKE_INDEX = 'CREATE INDEX IF NOT EXISTS "%s__json_%s" ON "%s" (%s)' % (
+            self.tablename, field.replace('"', '""'), self.tablename, self._json_field(field))
+        self.conn.execute(MAKE_INDEX)
+        self.commit()
+
+    @staticmethod
+    def _json_path(field):
+        """SQL string literal with the JSON path of `field`."""
+        if not field.startswith('$'):
+            if '"' in field:
+                # SQLite's JSON paths have no way to escape it within a quoted label
+                raise ValueError('Field %r contains a double quote, use a "$" JSON path instead' % field)
+            field = '$' + ''.join('."%s"' % part for part in field.split('.'))
+        return "'%s'" % field.replace("'", "''")
+
+    def _json_field(self, field):
+        """SQL expression extracting `field` from a JSON value (must stay the same, for indexes to apply)."""
+        return 'json_extract(value, %s)' % self._json_path(field)
+
     @staticmethod
-    def get_tablenames(filename):
-        """get the names of the tables in an sqlite db as a list"""
+    def get_tablenames(filename, stats=False):
+        """
+        get the names of the tables in an sqlite db as a list
+
+        With `stats`, return a catalog instead: a dict of table name => the
+        storage statistics of that table, as returned by `storage_stats()`.
+        """
         if not os.path.isfile(filename):
             raise IOError('file %s does not exist' % (filename))
         GET_TABLENAMES = 'SELECT name FROM sqlite_master WHERE type="table"'
         with sqlite3.connect(filename) as conn:
             cursor = conn.execute(GET_TABLENAMES)
             res = cursor.fetchall()
+            if stats:
+                def query(req, arg=()):
+                    return conn.execute(req, arg).fetchall()
+                return dict((name, _storage_stats(query, name)) for name, in res)
 
         return [name[0] for name in res]
 
+    def storage_stats(self):
+        """
+        Report how much space this table takes, as a dict with:
+
+          * `rows`: the number of items
+          * `key_bytes`, `value_bytes`: the total size of the stored keys / values,
+            and `avg_key_bytes`, `avg_value_bytes`, `max_value_bytes`
+          * `value_size_histogram`: dict of size => number of values of at most
+            that many bytes (and more than half of it), sizes being powers of two
+          * with `dedup`, the above count each value once per key that has it,
+            and `stored_value_bytes` is the total size of the distinct values
+            actually stored (in `<tablename>__content`, whose pages are included
+            in `pages`)
+          * `pages`: dict of the table and each of its indexes => dict with its
+            number of `pages`, `overflow_pages` (parts of large values that
+            didn't fit in a page), and `bytes` on disk; None if SQLite was built
+            without the `dbstat` virtual table
+          * `page_size`, `page_count`, `freelist_pages`: for the whole database
+            file; free pages are reused by new data, or reclaimed by VACUUM
+
+        The sizes are computed by scanning the whole table (and its pages),
+        which takes a while for large tables.
+        """
+        def query(req, arg=None):
+            return list(self.conn.select(req, arg))
+        return _storage_stats(query, self.tablename.replace('""', '"'))
+
     def commit(self, blocking=True):
         """
         Persist all data to disk.
@@ -378,11 +2124,102 @@ class SqliteDict(DictClass):
             self.conn.commit(blocking)
     sync = commit
 
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager that makes all changes inside the `with` block atomic::
+
+            with mydict.transaction():
+                mydict['a'] = 1
+                mydict['b'] = 2
+
+        If the block raises an exception, all its changes are rolled back and
+        the exception is re-raised. Otherwise, the changes are committed when
+        the outermost block exits (along with any earlier uncommitted changes).
+
+        Blocks can be nested: an inner block is an SQLite SAVEPOINT, whose
+        changes are rolled back on an exception without affecting the
+        enclosing block. Inside a transaction, autocommit, group commit and
+        `commit()` are suspended until the outermost block exits.
+
+        Writes inside the block don't wait for SQLite: if one of them fails,
+        the block is rolled back when it exits, which raises the error.
+
+        There is one database connection per SqliteDict, so the changes made
+        by other threads while the block is open become part of it, too. Their
+        own blocks wait for it to exit: only one thread at a time is inside a
+        transaction.
+        """
+        if self.flag == 'r':
+            raise RuntimeError('Refusing to open a transaction in read-only SqliteDict')
+
+        name = 'sqlitedict_%d' % next(_savepoint_ids)
+        depth = getattr(self._local, 'depth', 0)
+        if not depth:
+            # the savepoints of the single connection form one stack, which the blocks of two threads would mix up
+            self._transaction_lock.acquire()
+        try:
+            self.conn.execute(_REQUEST_SAVEPOINT, name)
+            self._local.depth = depth + 1
+            try:
+                yield self
+            except BaseException:
+                self.conn.release(name, rollback=True)
+                raise
+            else:
+                # raises the error of any write of the block that failed, after rolling the block back
+                self.conn.release(name)
+            finally:
+                self._local.depth = depth
+            if not depth:
+                self.commit()
+        finally:
+            if not depth:
+                self._transaction_lock.release()
+
+    def backup(self, dest, pages_per_step=1024, progress=None):
+        """
+        Make a consistent copy of the whole database file (all tables), while it
+        is in use.
+
+        `dest` is either a filename, which gets overwritten with the copy, or
+        another SqliteDict whose database gets replaced by the copy. The latter
+        is handy for loading a database file into a `filename=':memory:'`
+        SqliteDict, for fast read-only serving.
+
+        The copy is made `pages_per_step` database pages at a time, using the
+        SQLite online backup API. When copying into a file, requests from other
+        threads are served between the steps, so that they are not blocked
+        for the whole duration of the copy. Any pending changes are committed
+        first, and writes that arrive during the backup are committed between
+        the steps.
+
+        `progress`, if given, is called after each step as `progress(status,
+        remaining, total)`, with `remaining` and `total` counted in pages.
+
+        This call blocks until the copy is complete.
+        """
+        if isinstance(dest, SqliteDict):
+            if dest.flag == 'r':
+                raise RuntimeError('Refusing to back up into read-only SqliteDict')
+            if self.filename == ':memory:':
+                raise RuntimeError('Cannot copy an in-memory SqliteDict into another SqliteDict')
+            self.commit()
+            dest.conn.backup(self.filename, pages_per_step, progress, restore=True)
+            if dest._bloom is not None:
+                dest.rebuild_bloom()
+        else:
+            self.conn.backup(dest, pages_per_step, progress)
+
     def close(self, do_log=True, force=False):
         if do_log:
             logger.debug("closing %s" % self)
+        if self._stale_conn:
+            # never used in this forked child process: nothing to commit, and no worker thread to stop
+            self.conn = None
         if hasattr(self, 'conn') and self.conn is not None:
-            if self.conn.autocommit and not force:
+            group_commit = self.commit_every is not None or self.commit_interval is not None
+            if (self.conn.autocommit or group_commit) and not force:
                 # typically calls to commit are non-blocking when autocommit is
                 # used.  However, we need to block on close() to ensure any
                 # awaiting exceptions are handled and that all data is
@@ -390,6 +2227,8 @@ class SqliteDict(DictClass):
                 self.conn.commit(blocking=True)
             self.conn.close(force=force)
             self.conn = None
+            if self._bloom is not None and self.bloom_persist and not force:
+                self._save_bloom()
         if self.in_temp:
             try:
                 os.remove(self.filename)
@@ -424,21 +2263,448 @@ class SqliteDict(DictClass):
             pass
 
 
-class SqliteMultithread(threading.Thread):
+def _unpickle_dict(settings, indexes):
+    """Reopen a pickled SqliteDict, see `SqliteDict.__reduce__`."""
+    db = SqliteDict(**settings)
+    db._indexes = dict(indexes)
+    return db
+
+
+# all SqliteDicts (and TieredSqliteDicts) of this process, to reconnect them in forked children
+_open_dicts = weakref.WeakValueDictionary()  # id => SqliteDict (which is unhashable)
+
+
+def _reconnect_after_fork():
+    for db in list(_open_dicts.values()):
+        try:
+            db._after_fork()
+        except Exception:
+            logger.exception('failed to reconnect %s after fork', db)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reconnect_after_fork)
+
+
+class TieredSqliteDict(DictClass):
+    """
+    A SqliteDict with an in-memory tier in front of it, for the working set of
+    latency-critical code: the `hot_size` most recently used items are kept
+    decoded in RAM, and served from there without going through SQLite.
+
+    Reads of other keys fetch them from the SqliteDict, and promote them into
+    the hot tier, evicting the least recently used items if it's full. Writes go
+    into the hot tier, and are written back to the SqliteDict in batches, once
+    `flush_every` of them are pending, or on `flush()`, `commit()` and `close()`.
+    The batches are queued without waiting for SQLite, like all the writes of a
+    SqliteDict. Until then, the pending writes are lost in a crash.
+
+    On close, the keys in the hot tier are saved in the side table
+    `<tablename>__hotkeys`; with `warm`, the hot tier is filled with them again
+    on open, so that a restarted process starts with its working set in memory.
+
+    All other arguments are passed on to the SqliteDict, available as `self.store`.
+    As with SqliteDict, a mutable value must be assigned back after changing it
+    to get written; until it's evicted, the changed value is what later reads see.
+    """
+    def __init__(self, filename=None, tablename='unnamed', hot_size=10000, flush_every=1000, warm=True, **kwargs):
+        self.store = SqliteDict(filename, tablename=tablename, **kwargs)
+        self.hot_size = hot_size
+        self.flush_every = flush_every
+        self._hot = OrderedDict()  # key => value, least recently used first
+        self._dirty = {}  # key => value not written back yet, or _MISSING if deleted
+        self._writes = 0  # number of writes so far, to detect those made during a read from the SqliteDict
+        self._lock = threading.RLock()  # never held while waiting for SQLite
+        self.hits = 0  # reads served by the hot tier
+        self.misses = 0  # reads that went to the SqliteDict
+        if warm:
+            self._warm()
+        _open_dicts[id(self)] = self
+
+    def _after_fork(self):
+        """In a forked child process: drop the pending writes, which the parent process owns."""
+        self._lock = threading.RLock()  # may have been held by another thread of the parent
+        for key in self._dirty:
+            self._hot.pop(key, None)
+        self._dirty = {}
+
+    def _warm(self):
+        store = self.store
+        if not store._has_table('%s__hotkeys' % store.tablename):
+            return
+        GET_HOT = (
+            'SELECT h.key, t.value FROM "%s__hotkeys" AS h JOIN "%s" AS t ON t.key = h.key ORDER BY h.rank LIMIT ?'
+        ) % (store.tablename, store._values_table)
+        for batch in store.conn.select_batches(GET_HOT, (self.hot_size,)):
+            for key, value in batch:
+                self._hot[store.decode_key(key)] = store.decode(value)
+
+    def _promote(self, key, value):
+        """Make `key` the most recently used item of the hot tier, evicting the least recently used if full."""
+        self._hot[key] = value
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value = self._hot[key]
+            except KeyError:
+                pass
+            else:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            if key in self._dirty:
+                value = self._dirty[key]
+                if value is _MISSING:
+                    raise KeyError(key)
+                self._promote(key, value)
+                return value
+            writes = self._writes
+
+        # outside the lock, so that the hot tier keeps serving the other threads in the meantime
+        value = self.store[key]
+        with self._lock:
+            # unless written in the meantime: the value read may be out of date already
+            if self._writes == writes:
+                self._promote(key, value)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._hot:
+                return True
+            if key in self._dirty:
+                return self._dirty[key] is not _MISSING
+        return key in self.store
+
+    def __setitem__(self, key, value):
+        if self.store.flag == 'r':
+            raise RuntimeError('Refusing to write to read-only SqliteDict')
+        with self._lock:
+            self._promote(key, value)
+            self._dirty[key] = value
+            self._writes += 1
+            if len(self._dirty) >= self.flush_every:
+                self.flush()
+
+    def __delitem__(self, key):
+        if self.store.flag == 'r':
+            raise RuntimeError('Refusing to delete from read-only SqliteDict')
+        if key not in self:
+            raise KeyError(key)
+        with self._lock:
+            self._hot.pop(key, None)
+            self._dirty[key] = _MISSING
+            self._writes += 1
+            if len(self._dirty) >= self.flush_every:
+                self.flush()
+
+    def update(self, items=(), **kwds):
+        try:
+            items = items.items()
+        except AttributeError:
+            pass
+        for key, value in itertools.chain(items, kwds.items()):
+            self[key] = value
+
+    def flush(self):
+        """Queue up all the pending writes to the SqliteDict, in one batch (plus one for deletes)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            # still under the lock, so that the batches of several threads are queued in order
+            deleted = [key for key, value in dirty.items() if value is _MISSING]
+            if deleted:
+                self.store._delete_items(deleted)
+            if len(deleted) < len(dirty):
+                self.store.update((key, value) for key, value in dirty.items() if value is not _MISSING)
+
+    def commit(self, blocking=True):
+        self.flush()
+        self.store.commit(blocking)
+
+    def __len__(self):
+        self.flush()
+        return len(self.store)
+
+    def __bool__(self):
+        if self._hot:
+            return True
+        self.flush()
+        return bool(self.store)
+
+    def __iter__(self):
+        self.flush()
+        return self.store.iterkeys()
+
+    def keys(self):
+        return self.__iter__()
+
+    def values(self):
+        self.flush()
+        return self.store.itervalues()
+
+    def items(self):
+        self.flush()
+        return self.store.iteritems()
+
+    def clear(self):
+        with self._lock:
+            self._hot.clear()
+            self._dirty.clear()
+            self._writes += 1
+            self.store.clear()
+
+    def hot_keys(self):
+        """The keys in the hot tier, from the least to the most recently used."""
+        with self._lock:
+            return list(self._hot)
+
+    def _save_hot_keys(self):
+        """Replace the saved hot keys by those of the hot tier, once the SqliteDict is closed."""
+        store = self.store
+        if store.flag == 'r' or store.in_temp or store.filename == ':memory:':
+            return
+        HOT_TABLE = '%s__hotkeys' % store.tablename
+        keys = [(rank, store.encode_key(key)) for rank, key in enumerate(self.hot_keys())]
+        try:
+            conn = sqlite3.connect(store.filename)
+            try:
+                with conn:
+                    conn.execute('CREATE TABLE IF NOT EXISTS "%s" (rank INTEGER PRIMARY KEY, key TEXT)' % HOT_TABLE)
+                    conn.execute('DELETE FROM "%s"' % HOT_TABLE)
+                    conn.executemany('INSERT INTO "%s" (rank, key) VALUES (?, ?)' % HOT_TABLE, keys)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            logger.exception('failed to save the hot keys of %s', store)
+
+    def close(self, do_log=True, force=False):
+        """Write back the pending writes and close the SqliteDict (which doesn't commit them without autocommit)."""
+        if self.store.conn is None:
+            return
+        if not force:
+            self.flush()
+        self.store.close(do_log=do_log, force=force)
+        if not force:
+            self._save_hot_keys()
+
+    def __enter__(self):
+        self.store.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __str__(self):
+        return 'TieredSqliteDict(%s)' % self.store.filename
+
+    def __repr__(self):
+        return str(self)
+
+
+class _PriorityRequests(Queue):
+    """
+    Request queue that serves reads (SELECTs) ahead of all the other requests,
+    which are served in order.
+
+    At most `read_priority` reads are served in a row while other requests are
+    waiting, so that writes are never starved. A read from a thread that still
+    has other requests waiting in the queue is not prioritized, so that the
+    thread reads its own writes.
+    """
+    def __init__(self, read_priority):
+        self.read_priority = read_priority
+        Queue.__init__(self)
+
+    def _init(self, maxsize):
+        self.reads = deque()
+        self.others = deque()  # (thread ident, request) pairs
+        self.waiting = {}  # thread ident => number of its requests in self.others
+        self.reads_in_row = 0  # reads served in a row while other requests were waiting
+
+    def _qsize(self):
+        return len(self.reads) + len(self.others)
+
+    def _put(self, item):
+        # runs in the thread that issued the request
+        ident = threading.get_ident()
+        req, _, res_ref = item[:3]
+        is_read = res_ref is not None and (req == _REQUEST_SELECT_BATCHES or not req.startswith('--'))
+        if is_read and not self.waiting.get(ident):
+            self.reads.append(item)
+        else:
+            self.others.append((ident, item))
+            self.waiting[ident] = self.waiting.get(ident, 0) + 1
+
+    def _get(self):
+        if self.reads and (not self.others or self.reads_in_row < self.read_priority):
+            if self.others:
+                self.reads_in_row += 1
+            return self.reads.popleft()
+        self.reads_in_row = 0
+        ident, item = self.others.popleft()
+        self.waiting[ident] -= 1
+        if not self.waiting[ident]:
+            del self.waiting[ident]
+        return item
+
+
+class _Deadlines(object):
+    """
+    Deadlines of the operations of a connection class, for each calling thread:
+    `op_timeout` seconds after the start of each operation, and/or the end of
+    the `deadline()` blocks the operation runs in, whichever comes first.
+    """
+    op_timeout = None
+
+    @contextmanager
+    def deadline(self, seconds):
+        """Make the operations of the calling thread inside the block time out `seconds` from now."""
+        outer = getattr(self._deadlines, 'deadline', None)
+        deadline = time.time() + seconds
+        self._deadlines.deadline = deadline if outer is None else min(outer, deadline)
+        try:
+            yield
+        finally:
+            self._deadlines.deadline = outer
+
+    def _deadline(self):
+        """The time by which the operation the calling thread is starting must be done, or None."""
+        deadline = getattr(self._deadlines, 'deadline', None)
+        if self.op_timeout is not None:
+            own = time.time() + self.op_timeout
+            deadline = own if deadline is None else min(deadline, own)
+        return deadline
+
+    @staticmethod
+    def _progress_handler(deadline, interrupted):
+        """
+        A progress handler that interrupts the running statement once `deadline`
+        has passed, appending to the list `interrupted` when it does. Only once,
+        so that the rollback that follows runs to completion.
+        """
+        def handler():
+            if not interrupted and time.time() >= deadline:
+                interrupted.append(True)
+                return 1
+            return 0
+        return handler
+
+    @contextmanager
+    def _interruptible(self, conn):
+        """
+        Run the block under the deadline of the calling thread, if any: raise
+        TimeoutError if it has already passed, or once it passes while the block
+        runs statements on `conn` (which are then interrupted) or waits for a lock.
+        """
+        deadline = self._deadline()
+        if deadline is None:
+            yield
+            return
+        if time.time() >= deadline:
+            raise TimeoutError('SqliteDict operation timed out')
+        interrupted = []
+        # the progress handler isn't called while waiting for another connection to release its lock
+        busy_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+        conn.execute('PRAGMA busy_timeout = %d' % min(busy_timeout, int((deadline - time.time()) * 1000) + 1))
+        conn.set_progress_handler(self._progress_handler(deadline, interrupted), _PROGRESS_STEPS)
+        try:
+            yield
+        except sqlite3.OperationalError:
+            if interrupted or time.time() >= deadline:
+                raise TimeoutError('SqliteDict operation timed out')
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.execute('PRAGMA busy_timeout = %d' % busy_timeout)
+
+
+class SqliteMultithread(_Deadlines, threading.Thread):
     """
     Wrap sqlite connection in a way that allows concurrent requests from multiple threads.
 
     This is done by internally queueing the requests and processing them sequentially
     in a separate thread (in the same order they arrived).
 
+    With `slow_threshold` (in seconds), each request that took longer than that,
+    from being queued to being done, is reported to `on_slow` as a dict with:
+
+      * `request`: the SQL command, or the --magic-- command
+      * `statements`: the SQL statements actually run, as traced by SQLite
+      * `queue_wait`, `execution`: the seconds spent waiting in the queue, then running
+      * `plan`: the rows of `EXPLAIN QUERY PLAN` of the SQL command, with `explain_slow`
+      * `stack`: the stack of the caller, with `outer_stack`
+
+    Only a random `trace_sample` fraction of the requests is timed.
+
+    With `read_priority`, reads are served ahead of the other requests, see `_PriorityRequests`.
+
+    With `max_queue_items` and/or `max_queue_bytes`, `execute` blocks while the
+    queued writes (requests without a response queue, and batches of statements)
+    already reach that many requests or bytes of arguments, for at most
+    `queue_timeout` seconds before raising `queue.Full`. Other requests with a
+    response queue, such as selects, are not limited: their callers wait for the
+    response anyway.
+
+    With `op_timeout` (in seconds) or inside a `deadline()` block, callers that
+    wait for a response raise TimeoutError once the deadline passes. Reads and
+    `call`s still in the queue by then are skipped, and those running are
+    interrupted (a `call` is rolled back). Other requests, such as writes and
+    commits, are never dropped: they complete, only the wait for them is cut short.
+
     """
-    def __init__(self, filename, autocommit, journal_mode, outer_stack=True):
+    def __init__(self, filename, autocommit, journal_mode, outer_stack=True, commit_every=None,
+                 commit_interval=None, slow_threshold=None, on_slow=None, explain_slow=False,
+                 trace_sample=1.0, read_priority=None, max_queue_items=None, max_queue_bytes=None,
+                 queue_timeout=None, op_timeout=None):
         super(SqliteMultithread, self).__init__()
         self.filename = filename
         self.autocommit = autocommit
         self.journal_mode = journal_mode
-        # use request queue of unlimited size
-        self.reqs = Queue()
+        # group commit: commit after `commit_every` operations, or `commit_interval` seconds
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        # slow operation log, see the class docstring
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self.explain_slow = explain_slow
+        self.trace_sample = trace_sample
+        # state of the worker thread, only touched from inside run()
+        self._savepoints = 0  # number of currently open savepoints
+        self._errors = 0  # number of errors recorded for the calling threads so far
+        self._savepoint_errors = {}  # savepoint name => self._errors when it was opened
+        self._uncommitted = 0  # operations since the last commit, for group commit
+        self._dirty_since = None  # time of the oldest uncommitted change, for group commit
+        self._traced = None  # SQL statements run by the request being timed, for the slow operation log
+        # use request queue of unlimited size, and limit the fire-and-forget requests in it ourselves
+        self.reqs = Queue() if read_priority is None else _PriorityRequests(read_priority)
+        self.max_queue_items = max_queue_items
+        self.max_queue_bytes = max_queue_bytes
+        self.queue_timeout = queue_timeout
+        self._room = threading.Condition()  # notified when fire-and-forget requests leave the queue
+        self._queued_items = 0  # fire-and-forget requests in the queue
+        self._queued_bytes = 0  # total size of their arguments
+        self.throttled = 0  # number of requests that had to wait for room in the queue
+        self.throttled_seconds = 0.0  # total time they waited
+        # deadlines, see _Deadlines
+        self.op_timeout = op_timeout
+        self._deadlines = threading.local()
+        self._interrupted = []  # not empty once the request being processed was interrupted
+        self._current_res = None  # response queue reference of that request
+        # requests that arrived during a backup, but have to wait until it finishes
+        self._deferred = []
         self.daemon = True
         self._outer_stack = outer_stack
         self.log = logging.getLogger('sqlitedict.SqliteMultithread')
@@ -507,56 +2773,207 @@ class SqliteMultithread(threading.Thread):
             # arg: arguments for the command
             # res_ref: a weak reference to the queue into which responses must be placed
             # outer_stack: the outer stack, for producing more informative traces in case of error
+            # queued: the time the request was queued at
+            # deadline: the time the caller stops waiting for the response at, or None
             #
-            req, arg, res_ref, outer_stack = self.reqs.get()
+            if self._deferred:
+                req, arg, res_ref, outer_stack, queued, deadline = self._deferred.pop(0)
+            else:
+                req, arg, res_ref, outer_stack, queued, deadline = self._get_request(conn)
 
             if req == _REQUEST_CLOSE:
                 assert res_ref, ('--close-- without return queue', res_ref)
                 break
-            elif req == _REQUEST_COMMIT:
-                conn.commit()
-                _put(res_ref, _RESPONSE_NO_MORE)
+            self._process(conn, cursor, req, arg, res_ref, outer_stack, queued, deadline)
+
+        self.log.debug('received: %s, send: --no more--', req)
+        conn.close()
+
+        _put(res_ref, _RESPONSE_NO_MORE)
+
+    def _get_request(self, conn):
+        """Wait for the next request, committing in the meantime if group commit calls for it."""
+        if self._dirty_since is not None and self.commit_interval is not None:
+            try:
+                return self._dequeued(
+                    self.reqs.get(timeout=max(0, self._dirty_since + self.commit_interval - time.time())))
+            except Empty:
+                self._commit(conn)
+        return self._dequeued(self.reqs.get())
+
+    def _limited(self, req, arg, res_ref):
+        """Is the request subject to the queue limits? Return its size in bytes if so, None if not."""
+        if self.max_queue_items is None and self.max_queue_bytes is None:
+            return None
+        # writes are limited even when they have a response queue, like the batches of `update()`
+        if res_ref is not None and req != _REQUEST_EXECUTEMANY:
+            return None
+        if self.max_queue_bytes is None:
+            return 0
+        if req == _REQUEST_EXECUTEMANY:
+            return sum(_args_size(args) for _, items in arg for args in items)
+        return _args_size(arg)
+
+    def _wait_for_room(self, size):
+        """Block until a request of `size` bytes fits in the queue, then account for it."""
+        deadline = self._deadline()
+        with self._room:
+            started = None
+            # never block the worker thread itself (e.g. writing from a backup progress callback): it would deadlock
+            while threading.current_thread() is not self and (
+                (self.max_queue_items is not None and self._queued_items >= self.max_queue_items)
+                or (self.max_queue_bytes is not None and self._queued_bytes
+                    and self._queued_bytes + size > self.max_queue_bytes)
+            ):
+                if started is None:
+                    started = time.time()
+                    self.throttled += 1
+                remaining = None if self.queue_timeout is None else started + self.queue_timeout - time.time()
+                if remaining is not None and remaining <= 0:
+                    self.throttled_seconds += time.time() - started
+                    raise Full('SqliteDict request queue is full')
+                if deadline is not None:
+                    if deadline <= time.time():
+                        self.throttled_seconds += time.time() - started
+                        raise TimeoutError('SqliteDict operation timed out')
+                    remaining = deadline - time.time() if remaining is None else min(remaining, deadline - time.time())
+                self._room.wait(remaining)
+            if started is not None:
+                self.throttled_seconds += time.time() - started
+            self._queued_items += 1
+            self._queued_bytes += size
+
+    def _dequeued(self, item):
+        """Account for the request `item` leaving the queue; return it."""
+        size = self._limited(*item[:3])
+        if size is not None:
+            with self._room:
+                self._queued_items -= 1
+                self._queued_bytes -= size
+                self._room.notify_all()
+        return item
+
+    def _commit(self, conn):
+        """Commit, unless inside a savepoint: then the commit happens when the outermost one is released."""
+        if not self._savepoints:
+            conn.commit()
+            self._uncommitted, self._dirty_since = 0, None
+
+    def _group_commit(self, conn):
+        """Count an operation towards group commit, and commit if it's time."""
+        if self._savepoints or not conn.in_transaction:
+            return
+        self._uncommitted += 1
+        if self._dirty_since is None:
+            self._dirty_since = time.time()
+        if self.commit_every is not None and self._uncommitted >= self.commit_every:
+            self._commit(conn)
+        elif self.commit_interval is not None and time.time() - self._dirty_since >= self.commit_interval:
+            self._commit(conn)
+
+    def _process(self, conn, cursor, req, arg, res_ref, outer_stack, queued, deadline):
+        """Handle a single request taken from the request queue (except --close--)."""
+        # only reads and calls get cancelled; they change nothing, or get rolled back
+        cancellable = deadline is not None and res_ref is not None and (
+            req in (_REQUEST_SELECT_BATCHES, _REQUEST_CALL) or not req.startswith('--'))
+        if cancellable:
+            if time.time() >= deadline:
+                # the caller has stopped waiting already
+                _put(res_ref, _RESPONSE_TIMED_OUT)
+                return
+            self._interrupted, self._current_res = [], res_ref
+            conn.set_progress_handler(self._progress_handler(deadline, self._interrupted), _PROGRESS_STEPS)
+
+        traced, outer_traced = None, self._traced  # the latter is set while serving requests during a backup
+        if self.slow_threshold is not None and (self.trace_sample >= 1 or random.random() < self.trace_sample):
+            self._traced = traced = []
+            conn.set_trace_callback(traced.append)
+            started = time.time()
+
+        self._process_request(conn, cursor, req, arg, res_ref, outer_stack)
+        if cancellable:
+            conn.set_progress_handler(None, 0)
+            self._interrupted, self._current_res = [], None
+        if self.autocommit:
+            self._commit(conn)
+        elif self.commit_every is not None or self.commit_interval is not None:
+            self._group_commit(conn)
+
+        if traced is not None:
+            finished = time.time()
+            self._traced = outer_traced
+            conn.set_trace_callback(outer_traced.append if outer_traced is not None else None)
+            if finished - queued >= self.slow_threshold:
+                self._report_slow(conn, req, arg, outer_stack, traced, started - queued, finished - started)
+
+    def _report_slow(self, conn, req, arg, outer_stack, statements, queue_wait, execution):
+        report = {
+            'request': req,
+            'statements': statements,
+            'queue_wait': queue_wait,
+            'execution': execution,
+            'plan': None,
+            'stack': traceback.format_list(outer_stack) if outer_stack else None,
+        }
+        try:
+            if self.explain_slow and not req.startswith('--'):
+                report['plan'] = conn.execute('EXPLAIN QUERY PLAN ' + req, arg).fetchall()
+            if self.on_slow is not None:
+                self.on_slow(report)
             else:
+                self.log.warning(
+                    'slow operation: %.3fs in queue, %.3fs running %r', queue_wait, execution, statements or req)
+        except Exception:
+            self.log.exception('Failed to report slow operation %r', req)
+
+    def _process_request(self, conn, cursor, req, arg, res_ref, outer_stack):
+        if req == _REQUEST_COMMIT:
+            self._commit(conn)
+            _put(res_ref, _RESPONSE_NO_MORE)
+        elif req in (_REQUEST_SAVEPOINT, _REQUEST_RELEASE, _REQUEST_ROLLBACK):
+            self._savepoint(cursor, req, arg, outer_stack)
+            _put(res_ref, _RESPONSE_NO_MORE)
+        elif req == _REQUEST_BACKUP:
+            self._backup(conn, cursor, arg, outer_stack)
+            _put(res_ref, _RESPONSE_NO_MORE)
+        elif req == _REQUEST_CALL:
+            fn, fn_args = arg
+            try:
+                _put(res_ref, (_call_atomically(conn, fn, fn_args),))
+            except Exception:
+                self._set_exception(outer_stack)
+            _put(res_ref, _RESPONSE_NO_MORE)
+        elif req == _REQUEST_SELECT_BATCHES:
+            statement, statement_arg, batch_size = arg
+            try:
+                cursor.execute(statement, statement_arg)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch or _put(res_ref, batch) == _PUT_REFERENT_DESTROYED:
+                        break
+            except Exception:
+                self._set_exception(outer_stack)
+            _put(res_ref, _RESPONSE_NO_MORE)
+        elif req == _REQUEST_EXECUTEMANY:
+            try:
+                if self.autocommit and not conn.in_transaction:
+                    # one transaction for the whole batch, not one per statement
+                    cursor.execute('BEGIN')
+                for statement, items in arg:
+                    cursor.executemany(statement, items)
+            except Exception:
+                if self.autocommit and not self._savepoints:
+                    conn.rollback()
+                self._set_exception(outer_stack)
+            _put(res_ref, _RESPONSE_NO_MORE)
+        else:
+            try:
+                cursor.execute(req, arg)
+            except Exception:
+                self._set_exception(outer_stack)
+
+            if res_ref:
                 try:
-                    cursor.execute(req, arg)
-                except Exception:
-                    with self._lock:
-                        self.exception = (e_type, e_value, e_tb) = sys.exc_info()
-
-                    inner_stack = traceback.extract_stack()
-
-                    # An exception occurred in our thread, but we may not
-                    # immediately able to throw it in our calling thread, if it has
-                    # no return `res` queue: log as level ERROR both the inner and
-                    # outer exception immediately.
-                    #
-                    # Any iteration of res.get() or any next call will detect the
-                    # inner exception and re-raise it in the calling Thread; though
-                    # it may be confusing to see an exception for an unrelated
-                    # statement, an ERROR log statement from the 'sqlitedict.*'
-                    # namespace contains the original outer stack location.
-                    self.log.error('Inner exception:')
-                    for item in traceback.format_list(inner_stack):
-                        self.log.error(item)
-                    self.log.error('')  # deliniate traceback & exception w/blank line
-                    for item in traceback.format_exception_only(e_type, e_value):
-                        self.log.error(item)
-
-                    self.log.error('')  # exception & outer stack w/blank line
-
-                    if self._outer_stack:
-                        self.log.error('Outer stack:')
-                        for item in traceback.format_list(outer_stack):
-                            self.log.error(item)
-                        self.log.error('Exception will be re-raised at next call.')
-                    else:
-                        self.log.error(
-                            'Unable to show the outer stack. Pass '
-                            'outer_stack=True when initializing the '
-                            'SqliteDict instance to show the outer stack.'
-                        )
-
-                if res_ref:
                     for rec in cursor:
                         if _put(res_ref, rec) == _PUT_REFERENT_DESTROYED:
                             #
@@ -565,16 +2982,123 @@ class SqliteMultithread(threading.Thread):
                             # stop sending responses.
                             #
                             break
+                except Exception:
+                    self._set_exception(outer_stack)
 
-                    _put(res_ref, _RESPONSE_NO_MORE)
+                _put(res_ref, _RESPONSE_NO_MORE)
 
-                if self.autocommit:
-                    conn.commit()
+    def _savepoint(self, cursor, req, name, outer_stack):
+        try:
+            if req == _REQUEST_SAVEPOINT:
+                cursor.execute('SAVEPOINT "%s"' % name)
+                self._savepoints += 1
+                self._savepoint_errors[name] = self._errors
+            else:
+                opened_errors = self._savepoint_errors.pop(name, self._errors)
+                if req == _REQUEST_RELEASE and self.exception is not None and self._errors > opened_errors:
+                    # a write inside the block failed and its error wasn't reported yet: roll the block back
+                    req = _REQUEST_ROLLBACK
+                if req == _REQUEST_ROLLBACK:
+                    cursor.execute('ROLLBACK TO "%s"' % name)
+                self._savepoints -= 1
+                cursor.execute('RELEASE "%s"' % name)
+        except Exception:
+            self._set_exception(outer_stack)
+
+    def _set_exception(self, outer_stack):
+        """Remember the exception being handled, to be re-raised in the calling thread."""
+        if self._interrupted:
+            # interrupted at the deadline: only the caller gets an error, a TimeoutError
+            self.log.debug('interrupted a request past its deadline: %s', sys.exc_info()[1])
+            _put(self._current_res, _RESPONSE_TIMED_OUT)
+            return
+        with self._lock:
+            self.exception = (e_type, e_value, e_tb) = sys.exc_info()
+            self._errors += 1
 
-        self.log.debug('received: %s, send: --no more--', req)
-        conn.close()
+        inner_stack = traceback.extract_stack()
 
-        _put(res_ref, _RESPONSE_NO_MORE)
+        # An exception occurred in our thread, but we may not
+        # immediately able to throw it in our calling thread, if it has
+        # no return `res` queue: log as level ERROR both the inner and
+        # outer exception immediately.
+        #
+        # Any iteration of res.get() or any next call will detect the
+        # inner exception and re-raise it in the calling Thread; though
+        # it may be confusing to see an exception for an unrelated
+        # statement, an ERROR log statement from the 'sqlitedict.*'
+        # namespace contains the original outer stack location.
+        self.log.error('Inner exception:')
+        for item in traceback.format_list(inner_stack):
+            self.log.error(item)
+        self.log.error('')  # deliniate traceback & exception w/blank line
+        for item in traceback.format_exception_only(e_type, e_value):
+            self.log.error(item)
+
+        self.log.error('')  # exception & outer stack w/blank line
+
+        if self._outer_stack:
+            self.log.error('Outer stack:')
+            for item in traceback.format_list(outer_stack):
+                self.log.error(item)
+            self.log.error('Exception will be re-raised at next call.')
+        else:
+            self.log.error(
+                'Unable to show the outer stack. Pass '
+                'outer_stack=True when initializing the '
+                'SqliteDict instance to show the outer stack.'
+            )
+
+    def _backup(self, conn, cursor, arg, outer_stack):
+        """
+        Copy the database of `conn` into the database `other` (or the other way
+        round, if `restore` is set), `pages` pages at a time.
+
+        While copying out of `conn`, requests that queued up in the meantime are
+        served between the steps, so that the copy doesn't block other threads.
+        """
+        other, pages, progress, restore = arg
+
+        def step(status, remaining, total):
+            if progress is not None:
+                progress(status, remaining, total)
+            if not restore:
+                self._serve_pending(conn, cursor)
+
+        try:
+            self._commit(conn)
+            other_conn = sqlite3.connect(other) if isinstance(other, str) else other
+            try:
+                if restore:
+                    other_conn.backup(conn, pages=pages, progress=step, sleep=0)
+                else:
+                    conn.backup(other_conn, pages=pages, progress=step, sleep=0)
+            finally:
+                if other_conn is not other:
+                    other_conn.close()
+        except Exception:
+            self._set_exception(outer_stack)
+
+    def _serve_pending(self, conn, cursor):
+        """Process the requests that are already waiting in the queue, in the middle of a backup."""
+        for _ in range(self.reqs.qsize()):
+            if self._deferred:
+                # something is already waiting for the backup to finish,
+                # everything else has to queue up behind it
+                break
+            try:
+                item = self._dequeued(self.reqs.get_nowait())
+            except Empty:
+                break
+            if item[0] in (_REQUEST_CLOSE, _REQUEST_BACKUP):
+                self._deferred.append(item)
+            else:
+                self._process(conn, cursor, *item)
+
+        if conn.in_transaction:
+            # The backup cannot make progress while its source connection holds
+            # uncommitted changes.
+            self._commit(conn)
 
     def check_raise_error(self):
         """
@@ -605,15 +3129,20 @@ class SqliteMultithread(threading.Thread):
                 # occurred.
                 reraise(e_type, e_value, e_tb)
 
-    def execute(self, req, arg=None, res=None):
+    def execute(self, req, arg=None, res=None, deadline=None):
         """
         `execute` calls are non-blocking: just queue up the request and return immediately.
 
         :param req: The request (an SQL command)
         :param arg: Arguments to the SQL command
         :param res: A queue in which to place responses as they become available
+        :param deadline: The time at which the caller stops waiting for the responses
         """
         self.check_raise_error()
+        self._enqueue(req, arg, res, deadline)
+
+    def _enqueue(self, req, arg=None, res=None, deadline=None):
+        """`execute`, without raising the errors of the previous requests first."""
         stack = None
 
         if self._outer_stack:
@@ -632,11 +3161,31 @@ class SqliteMultithread(threading.Thread):
         if res:
             res_ref = weakref.ref(res)
 
-        self.reqs.put((req, arg or tuple(), res_ref, stack))
+        arg = arg or tuple()
+        size = self._limited(req, arg, res_ref)
+        if size is not None:
+            self._wait_for_room(size)
+        self.reqs.put((req, arg, res_ref, stack, time.time(), deadline))
 
     def executemany(self, req, items):
-        for item in items:
-            self.execute(req, item)
+        """
+        Run the SQL command `req` once for each argument tuple in `items`.
+
+        The whole batch is queued as a single (non-blocking) request. With
+        autocommit, it is committed as a single transaction.
+        """
+        self.execute_batch([(req, items)])
+
+    def execute_batch(self, statements, res=None):
+        """
+        Like `executemany`, but for a list of (SQL command, argument tuples) pairs.
+
+        The commands are run in order, all in a single request, so that a
+        commit (autocommit or group commit) never happens between them.
+        If `res` is given, `_RESPONSE_NO_MORE` is put in that queue once
+        the whole batch has been run.
+        """
+        self.execute(_REQUEST_EXECUTEMANY, statements, res)
         self.check_raise_error()
 
     def select(self, req, arg=None):
@@ -647,11 +3196,17 @@ class SqliteMultithread(threading.Thread):
         request is dequeued, and although you can iterate over the result normally
         (`for res in self.select(): ...`), the entire result will be in memory.
         """
+        deadline = self._deadline() if req != _REQUEST_CLOSE else None
         res = Queue()  # results of the select will appear as items in this queue
-        self.execute(req, arg, res)
+        self.execute(req, arg, res, deadline)
         while True:
-            rec = res.get()
+            try:
+                rec = res.get(timeout=None if deadline is None else max(0, deadline - time.time()))
+            except Empty:
+                rec = _RESPONSE_TIMED_OUT
             self.check_raise_error()
+            if rec == _RESPONSE_TIMED_OUT:
+                raise TimeoutError('SqliteDict operation timed out')
             if rec == _RESPONSE_NO_MORE:
                 break
             yield rec
@@ -663,6 +3218,31 @@ class SqliteMultithread(threading.Thread):
         except StopIteration:
             return None
 
+    def call(self, fn, *args):
+        """
+        Call `fn(conn, *args)` in the worker thread, with its `sqlite3.Connection`,
+        and return the result. Blocks until done.
+
+        Nothing else runs on the connection in the meantime, and all the changes
+        made by `fn` are rolled back if it raises (and the exception re-raised).
+        """
+        return self.select_one(_REQUEST_CALL, (fn, args))[0]
+
+    def select_batches(self, req, arg=None, batch_size=1000):
+        """
+        Like `select`, but iterate over lists of up to `batch_size` records at a time,
+        fetched with `fetchmany` in the worker thread: one queue round-trip per
+        batch instead of one per record.
+
+        As with `select`, the worker thread doesn't wait for the batches to be
+        consumed: they pile up in the response queue if they are consumed more
+        slowly than they are fetched, up to the entire result. Waiting would
+        stall all the other requests, and deadlock a caller that makes a
+        blocking request while iterating.
+        """
+        for batch in self.select(_REQUEST_SELECT_BATCHES, (req, arg or tuple(), batch_size)):
+            yield batch
+
     def commit(self, blocking=True):
         if blocking:
             # by default, we await completion of commit() unless
@@ -674,6 +3254,29 @@ class SqliteMultithread(threading.Thread):
             # otherwise, we fire and forget as usual.
             self.execute(_REQUEST_COMMIT)
 
+    def release(self, name, rollback=False):
+        """
+        Close the savepoint `name`, rolling it back with `rollback=True`, and wait
+        until it's done. Always closed, even while an error of a previous request
+        awaits being raised. Without `rollback`, that error is raised afterwards,
+        and if it is from a request made after the savepoint was opened, the
+        savepoint is rolled back instead of being released.
+        """
+        res = Queue()
+        self._enqueue(_REQUEST_ROLLBACK if rollback else _REQUEST_RELEASE, name, res)
+        res.get()
+        if not rollback:
+            self.check_raise_error()
+
+    def backup(self, other, pages=-1, progress=None, restore=False):
+        """
+        Copy this database into `other` (a filename or an `sqlite3.Connection`).
+
+        With `restore=True`, copy `other` into this database instead. Blocks until
+        the copy is complete.
+        """
+        self.select_one(_REQUEST_BACKUP, (other, pages, progress, restore))
+
     def close(self, force=False):
         if force:
             # If a SqliteDict is being killed or garbage-collected, then select_one()
@@ -681,7 +3284,7 @@ class SqliteMultithread(threading.Thread):
             # can't process the request. Instead, push the close command to the requests
             # queue directly. If run() is still alive, it will exit gracefully. If not,
             # then there's nothing we can do anyway.
-            self.reqs.put((_REQUEST_CLOSE, None, weakref.ref(Queue()), None))
+            self.reqs.put((_REQUEST_CLOSE, None, weakref.ref(Queue()), None, time.time(), None))
         else:
             # we abuse 'select' to "iter" over a "--close--" statement so that we
             # can confirm the completion of close before joining the thread and
@@ -690,6 +3293,302 @@ class SqliteMultithread(threading.Thread):
             self.join()
 
 
+class SqliteImmutable(_Deadlines):
+    """
+    Read-only access to a database file that never changes, with the same
+    interface as SqliteMultithread.
+
+    There is no worker thread: each thread opens its own connection, with the
+    file opened as `immutable` (no locking at all) and memory-mapped, so that
+    reads from many threads run in parallel and come straight from the page cache.
+
+    """
+    def __init__(self, filename, mmap_size=1 << 30, op_timeout=None):
+        self.filename = filename
+        self.mmap_size = mmap_size
+        self.op_timeout = op_timeout
+        self._deadlines = threading.local()
+        self.autocommit = False
+        self.uri = 'file:%s?mode=ro&immutable=1' % pathname2url(os.path.abspath(filename))
+        self.log = logging.getLogger('sqlitedict.SqliteImmutable')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = {}  # thread ident => connection of that thread
+        self._closed = False
+
+        # open the connection of the calling thread right away, to fail early
+        self._connection()
+
+    def _connection(self):
+        """Return the connection of the calling thread, opening it if necessary."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        if self._closed:
+            raise RuntimeError('Cannot read from a closed SqliteDict')
+
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.text_factory = str
+        conn.execute('PRAGMA mmap_size = %d' % self.mmap_size)
+        with self._lock:
+            alive = set(thread.ident for thread in threading.enumerate())
+            for ident in list(self._conns):
+                # connections left over by threads that no longer exist
+                if ident not in alive:
+                    self._conns.pop(ident).close()
+            self._conns[threading.get_ident()] = conn
+        self._local.conn = conn
+        return conn
+
+    def check_raise_error(self):
+        """Errors are raised directly in the calling thread, there's never anything to check."""
+
+    def execute(self, req, arg=None, res=None):
+        raise RuntimeError('Refusing to write to immutable SqliteDict')
+
+    def executemany(self, req, items):
+        raise RuntimeError('Refusing to write to immutable SqliteDict')
+
+    def execute_batch(self, statements, res=None):
+        raise RuntimeError('Refusing to write to immutable SqliteDict')
+
+    def call(self, fn, *args):
+        raise RuntimeError('Refusing to write to immutable SqliteDict')
+
+    def select(self, req, arg=None):
+        """Iterate over the rows resulting from `req`, fetched lazily."""
+        for batch in self.select_batches(req, arg):
+            for rec in batch:
+                yield rec
+
+    def select_one(self, req, arg=None):
+        """Return only the first row of the SELECT, or None if there are no matching rows."""
+        conn = self._connection()
+        with self._interruptible(conn):
+            return conn.execute(req, arg or tuple()).fetchone()
+
+    def select_batches(self, req, arg=None, batch_size=1000):
+        """Iterate over lists of up to `batch_size` rows resulting from `req`."""
+        conn = self._connection()
+        with self._interruptible(conn):
+            cursor = conn.execute(req, arg or tuple())
+        while True:
+            with self._interruptible(conn):
+                batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
+
+    def commit(self, blocking=True):
+        """Nothing to commit in an immutable database."""
+
+    def backup(self, other, pages=-1, progress=None, restore=False):
+        if restore:
+            raise RuntimeError('Refusing to restore into immutable SqliteDict')
+        other_conn = sqlite3.connect(other) if isinstance(other, str) else other
+        try:
+            self._connection().backup(other_conn, pages=pages, progress=progress)
+        finally:
+            if other_conn is not other:
+                other_conn.close()
+
+    def close(self, force=False):
+        with self._lock:
+            self._closed = True
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
+
+
+class SqliteInline(_Deadlines):
+    """
+    Single-threaded access to the database, with the same interface as SqliteMultithread.
+
+    There is no worker thread and no queues: each request runs directly in the
+    calling thread, on a connection that belongs to the thread that created it.
+    Using it from any other thread raises RuntimeError. Errors are raised right
+    away, by the call that caused them. SELECTs are fetched entirely before
+    returning, as with SqliteMultithread, so that iterating over them while
+    writing is safe.
+
+    With group commit (`commit_every` and/or `commit_interval`), the commits
+    happen during the writes: without a worker thread, nothing commits an idle
+    connection after `commit_interval` seconds.
+    """
+    def __init__(self, filename, autocommit, journal_mode, commit_every=None, commit_interval=None,
+                 cached_statements=256, op_timeout=None):
+        self.filename = filename
+        self.autocommit = autocommit
+        self.journal_mode = journal_mode
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.log = logging.getLogger('sqlitedict.SqliteInline')
+        self._owner = threading.get_ident()
+        self._savepoints = 0  # number of currently open savepoints
+        self._uncommitted = 0  # operations since the last commit, for group commit
+        self._dirty_since = None  # time of the oldest uncommitted change, for group commit
+        self.op_timeout = op_timeout
+        self._deadlines = threading.local()
+
+        # the sqlite3 module keeps up to `cached_statements` prepared statements for reuse
+        if autocommit:
+            self._conn = sqlite3.connect(filename, isolation_level=None, cached_statements=cached_statements)
+        else:
+            self._conn = sqlite3.connect(filename, cached_statements=cached_statements)
+        self._conn.execute('PRAGMA journal_mode = %s' % journal_mode)
+        self._conn.text_factory = str
+        self._conn.commit()
+        self._conn.execute('PRAGMA synchronous=OFF')
+
+    def _check_thread(self):
+        if threading.get_ident() != self._owner:
+            raise RuntimeError(
+                'SqliteDict opened with threaded=False can only be used from the thread that opened it')
+        if self._conn is None:
+            raise RuntimeError('Cannot use a closed SqliteDict')
+
+    def _done(self):
+        """Commit after a write, if autocommit or group commit call for it."""
+        if self._savepoints or not self._conn.in_transaction:
+            return
+        if self.autocommit:
+            self._commit()
+        elif self.commit_every is not None or self.commit_interval is not None:
+            self._uncommitted += 1
+            if self._dirty_since is None:
+                self._dirty_since = time.time()
+            if self.commit_every is not None and self._uncommitted >= self.commit_every:
+                self._commit()
+            elif self.commit_interval is not None and time.time() - self._dirty_since >= self.commit_interval:
+                self._commit()
+
+    def _commit(self):
+        if not self._savepoints:
+            self._conn.commit()
+            self._uncommitted, self._dirty_since = 0, None
+
+    def check_raise_error(self):
+        """Errors are raised directly in the calling thread, there's never anything to check."""
+
+    def execute(self, req, arg=None, res=None):
+        """Run the SQL command (or --magic-- command) `req` right away."""
+        self._check_thread()
+        if req in (_REQUEST_SAVEPOINT, _REQUEST_RELEASE, _REQUEST_ROLLBACK):
+            # closing a transaction() block must not fail
+            self._execute(req, arg)
+        else:
+            with self._interruptible(self._conn):
+                self._execute(req, arg)
+        if res is not None:
+            res.put(_RESPONSE_NO_MORE)
+
+    def _execute(self, req, arg):
+        if req == _REQUEST_COMMIT:
+            self._commit()
+        elif req in (_REQUEST_SAVEPOINT, _REQUEST_RELEASE, _REQUEST_ROLLBACK):
+            if req == _REQUEST_SAVEPOINT:
+                self._conn.execute('SAVEPOINT "%s"' % arg)
+                self._savepoints += 1
+            else:
+                if req == _REQUEST_ROLLBACK:
+                    self._conn.execute('ROLLBACK TO "%s"' % arg)
+                self._savepoints -= 1
+                self._conn.execute('RELEASE "%s"' % arg)
+        elif req == _REQUEST_EXECUTEMANY:
+            try:
+                if self.autocommit and not self._conn.in_transaction:
+                    self._conn.execute('BEGIN')
+                for statement, items in arg:
+                    self._conn.executemany(statement, items)
+            except Exception:
+                if self.autocommit and not self._savepoints:
+                    self._conn.rollback()
+                raise
+            self._done()
+        else:
+            self._conn.execute(req, arg or tuple())
+            self._done()
+
+    def executemany(self, req, items):
+        self.execute_batch([(req, items)])
+
+    def execute_batch(self, statements, res=None):
+        self.execute(_REQUEST_EXECUTEMANY, statements, res)
+
+    def call(self, fn, *args):
+        """Return `fn(conn, *args)`, with all its changes rolled back if it raises."""
+        self._check_thread()
+        with self._interruptible(self._conn):
+            result = _call_atomically(self._conn, fn, args)
+        self._done()
+        return result
+
+    def select(self, req, arg=None):
+        self._check_thread()
+        with self._interruptible(self._conn):
+            rows = self._conn.execute(req, arg or tuple()).fetchall()
+        self._done()
+        return iter(rows)
+
+    def select_one(self, req, arg=None):
+        """Return only the first row of the SELECT, or None if there are no matching rows."""
+        self._check_thread()
+        with self._interruptible(self._conn):
+            row = self._conn.execute(req, arg or tuple()).fetchone()
+        self._done()
+        return row
+
+    def select_batches(self, req, arg=None, batch_size=1000):
+        """Iterate over lists of up to `batch_size` rows resulting from `req`, fetched lazily."""
+        self._check_thread()
+        with self._interruptible(self._conn):
+            cursor = self._conn.execute(req, arg or tuple())
+        while True:
+            with self._interruptible(self._conn):
+                batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
+
+    def commit(self, blocking=True):
+        self.execute(_REQUEST_COMMIT)
+
+    def release(self, name, rollback=False):
+        """Close the savepoint `name`, rolling it back with `rollback=True`."""
+        self.execute(_REQUEST_ROLLBACK if rollback else _REQUEST_RELEASE, name)
+
+    def backup(self, other, pages=-1, progress=None, restore=False):
+        """
+        Copy this database into `other` (a filename or an `sqlite3.Connection`).
+
+        With `restore=True`, copy `other` into this database instead.
+        """
+        self._check_thread()
+        self._commit()
+        other_conn = sqlite3.connect(other) if isinstance(other, str) else other
+        try:
+            if restore:
+                other_conn.backup(self._conn, pages=pages, progress=progress)
+            else:
+                self._conn.backup(other_conn, pages=pages, progress=progress)
+        finally:
+            if other_conn is not other:
+                other_conn.close()
+
+    def close(self, force=False):
+        if self._conn is None:
+            return
+        if not force:
+            self._check_thread()
+        try:
+            self._conn.close()
+        except sqlite3.ProgrammingError:
+            # closing from another thread, e.g. by the garbage collector: the connection is closed when freed anyway
+            pass
+        self._conn = None
+
+
 #
 # This is here for .github/workflows/release.yml
 #
@@ -0,0 +1,72 @@
+import unittest
+import unittest.mock
+
+import sqlitedict
+from sqlitedict import SqliteDict, encode_array, decode_array
+from accessories import norm_file
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'requires NumPy')
+class ArrayCodecTest(unittest.TestCase):
+    def test_roundtrip(self):
+        for arr in [
+            numpy.arange(12, dtype='float32').reshape(3, 4),
+            numpy.arange(10, dtype='>i8')[::3],
+            numpy.float64(1.5),
+            numpy.zeros((0, 5), dtype='uint8'),
+        ]:
+            decoded = decode_array(encode_array(arr))
+            self.assertEqual(decoded.dtype, arr.dtype)
+            numpy.testing.assert_array_equal(decoded, arr)
+            self.assertFalse(decoded.flags.writeable)
+
+    def test_objects(self):
+        with self.assertRaises(ValueError):
+            encode_array(numpy.array([{}, []], dtype=object))
+
+    def test_without_numpy(self):
+        blob = encode_array(numpy.arange(6, dtype='float32').reshape(2, 3))
+        with unittest.mock.patch.object(sqlitedict, 'numpy', None):
+            decoded = decode_array(blob)
+        self.assertIsInstance(decoded, memoryview)
+        self.assertEqual(decoded.tolist(), [[0, 1, 2], [3, 4, 5]])
+
+
+@unittest.skipIf(numpy is None, 'requires NumPy')
+class GetManyArraysTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(norm_file('tests/db/sqlitedict-array.sqlite'), flag='n',
+                             encode=encode_array, decode=decode_array)
+        self.db.update(('key%d' % i, numpy.full(8, i, dtype='float32')) for i in range(1000))
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_get_many_arrays(self):
+        keys = ['key%d' % i for i in (5, 999, 0, 5)]
+        stacked = self.db.get_many_arrays(keys)
+        self.assertEqual(stacked.shape, (4, 8))
+        self.assertEqual(stacked.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(stacked[:, 0], [5, 999, 0, 5])
+        numpy.testing.assert_array_equal(self.db['key5'], stacked[0])
+
+    def test_many_chunks(self):
+        stacked = self.db.get_many_arrays('key%d' % i for i in range(1000))
+        numpy.testing.assert_array_equal(stacked[:, 7], numpy.arange(1000))
+
+    def test_out(self):
+        out = numpy.zeros((2, 8), dtype='float64')
+        self.assertIs(self.db.get_many_arrays(['key1', 'key2'], out=out), out)
+        self.assertEqual(out[1, 0], 2)
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            self.db.get_many_arrays(['key1', 'missing'])
+        self.db['odd'] = numpy.zeros(3)
+        with self.assertRaises(ValueError):
+            self.db.get_many_arrays(['key1', 'odd'])
@@ -0,0 +1,94 @@
+import threading
+import unittest
+
+from sqlitedict import SqliteDict, identity
+
+
+class ReadModifyWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_setdefault(self):
+        self.assertEqual(self.db.setdefault('a', [1]), [1])
+        self.assertEqual(self.db.setdefault('a', [2]), [1])
+        self.assertIsNone(self.db.setdefault('b'))
+        self.assertEqual(dict(self.db), {'a': [1], 'b': None})
+
+    def test_pop(self):
+        self.db['a'] = 1
+        self.assertEqual(self.db.pop('a'), 1)
+        self.assertNotIn('a', self.db)
+        self.assertEqual(self.db.pop('a', 'default'), 'default')
+        with self.assertRaises(KeyError):
+            self.db.pop('a')
+
+    def test_popitem(self):
+        self.db.update([('a', 1), ('b', 2)])
+        self.assertEqual(self.db.popitem(), ('a', 1))
+        self.assertEqual(self.db.popitem(), ('b', 2))
+        with self.assertRaises(KeyError):
+            self.db.popitem()
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.db.get_and_set('a', 1))
+        self.assertEqual(self.db.get_and_set('a', 2), 1)
+        self.assertEqual(self.db['a'], 2)
+
+    def test_update_value(self):
+        self.assertEqual(self.db.update_value('a', lambda value: value + [1], default=[]), [1])
+        self.assertEqual(self.db.update_value('a', lambda value: value + [2]), [1, 2])
+
+    def test_update_value_error(self):
+        self.db['a'] = 1
+        self.db.commit()
+
+        def fail(value):
+            raise ValueError(value)
+
+        with self.assertRaises(ValueError):
+            self.db.update_value('a', fail)
+        self.assertEqual(self.db['a'], 1)
+
+    def test_incr_threads(self):
+        def incr():
+            for _ in range(100):
+                self.db.incr('counter')
+
+        threads = [threading.Thread(target=incr) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.db['counter'], 500)
+        self.assertEqual(self.db.incr('counter', -100), 400)
+
+    def test_incr_sql(self):
+        with SqliteDict(encode=identity, decode=identity, changelog=True) as db:
+            self.assertEqual(db.incr('counter', 5), 5)
+            self.assertEqual(db.incr('counter'), 6)
+            self.assertEqual(db['counter'], 6)
+            self.assertEqual([op for _, op, _ in db.changes_since()], ['set', 'set'])
+
+    def test_side_writes(self):
+        self.db.add_index('value', lambda value: value)
+        self.db['a'] = 1
+        self.db.pop('a')
+        self.db.setdefault('b', 2)
+        self.assertEqual(list(self.db.find('value', 1)), [])
+        self.assertEqual(list(self.db.find('value', 2)), [('b', 2)])
+
+    def test_autocommit_and_inline(self):
+        for kwargs in ({'autocommit': True}, {'threaded': False}):
+            with SqliteDict(**kwargs) as db:
+                self.assertEqual(db.incr('a'), 1)
+                self.assertEqual(db.pop('a'), 1)
+                self.assertEqual(len(db), 0)
+
+    def test_read_only(self):
+        self.db.commit()
+        with SqliteDict(self.db.filename, flag='r') as db:
+            with self.assertRaises(RuntimeError):
+                db.setdefault('a', 1)
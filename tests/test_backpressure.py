@@ -0,0 +1,86 @@
+import sqlite3
+import threading
+import time
+import unittest
+from queue import Full
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class BackpressureTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-backpressure.sqlite')
+        self.locker = None
+
+    def tearDown(self):
+        self.unlock()
+        self.db.terminate()
+
+    def open(self, **kwargs):
+        self.db = SqliteDict(self.fname, flag='n', encode=str.encode, decode=bytes.decode, **kwargs)
+
+    def lock(self):
+        """Make the worker thread stall on the next write, until unlock()."""
+        self.locker = sqlite3.connect(self.fname)
+        self.locker.execute('BEGIN EXCLUSIVE')
+        self.db['stalled'] = 'x'
+        while self.db.conn.reqs.qsize():
+            time.sleep(0.001)
+
+    def unlock(self):
+        if self.locker is not None:
+            self.locker.rollback()
+            self.locker.close()
+            self.locker = None
+
+    def test_max_items(self):
+        self.open(max_queue_items=2, queue_timeout=0.05)
+        self.lock()
+        self.db['a'] = 'x'
+        self.db['b'] = 'x'
+        with self.assertRaises(Full):
+            self.db['c'] = 'x'
+        self.assertEqual(self.db.conn.throttled, 1)
+        self.assertGreaterEqual(self.db.conn.throttled_seconds, 0.05)
+
+    def test_max_bytes(self):
+        self.open(max_queue_bytes=100, queue_timeout=0)
+        self.lock()
+        self.db['a'] = 'x' * 60
+        with self.assertRaises(Full):
+            self.db['b'] = 'x' * 60
+        self.db['c'] = 'x' * 10
+
+    def test_blocks_until_room(self):
+        self.open(max_queue_items=1)
+        self.lock()
+        self.db['a'] = 'x'
+        writer = threading.Thread(target=self.db.__setitem__, args=('b', 'y'))
+        writer.start()
+        writer.join(0.05)
+        self.assertTrue(writer.is_alive())
+        self.unlock()
+        writer.join()
+        self.assertEqual(self.db['b'], 'y')
+        self.assertEqual(self.db.conn.throttled, 1)
+
+    def test_update(self):
+        self.open(max_queue_items=2, queue_timeout=0.05)
+        self.lock()
+        self.db.update({'a': 'x'})
+        self.db.update({'b': 'x'})
+        with self.assertRaises(Full):
+            self.db.update({'c': 'x'})
+        with self.assertRaises(Full):
+            self.db.update((('key%d' % i, 'x') for i in range(10)), batch_size=1)
+        self.assertEqual(self.db.conn.throttled, 2)
+
+    def test_reads_not_limited(self):
+        self.open(max_queue_items=1, queue_timeout=0)
+        for i in range(10):
+            self.db['key%d' % i] = str(i)
+            self.assertEqual(self.db['key%d' % i], str(i))
+        self.db.update(('key%d' % i, str(i)) for i in range(100))
+        self.db.commit()
+        self.assertEqual(len(self.db), 100)
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class BackupTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-backup-src.sqlite')
+        self.dest = norm_file('tests/db/sqlitedict-backup-dest.sqlite')
+        self.db = SqliteDict(self.fname, flag='n')
+        self.db.update(('key%d' % i, 'x' * 1000) for i in range(1000))
+
+    def tearDown(self):
+        self.db.terminate()
+        if os.path.isfile(self.dest):
+            os.unlink(self.dest)
+
+    def test_backup_to_file(self):
+        steps = []
+        self.db.backup(self.dest, pages_per_step=10, progress=lambda *args: steps.append(args))
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1][1], 0)  # nothing remaining
+
+        with SqliteDict(self.dest, flag='r') as copy:
+            self.assertEqual(len(copy), 1000)
+            self.assertEqual(copy['key0'], 'x' * 1000)
+
+    def test_requests_served_during_backup(self):
+        served, served_during_backup = [], []
+        reader = threading.Thread(target=lambda: served.append(self.db['key1']))
+
+        def progress(status, remaining, total):
+            # runs between the backup steps, inside the worker thread
+            if not reader.is_alive() and not served:
+                reader.start()
+                while not self.db.conn.reqs.qsize():
+                    time.sleep(0.001)
+            elif remaining and not served_during_backup:
+                reader.join(timeout=5)
+                served_during_backup.extend(served)
+
+        self.db.backup(self.dest, pages_per_step=10, progress=progress)
+        self.assertEqual(served_during_backup, ['x' * 1000])
+
+    def test_writes_during_backup(self):
+        def progress(status, remaining, total):
+            if remaining:
+                self.db['new%d' % remaining] = remaining
+
+        self.db.backup(self.dest, pages_per_step=10, progress=progress)
+        self.assertGreater(len(self.db), 1000)
+
+    def test_backup_into_memory(self):
+        self.db.commit()
+        with SqliteDict(':memory:') as mem:
+            self.db.backup(mem)
+            self.assertEqual(len(mem), 1000)
+            self.assertEqual(mem['key999'], 'x' * 1000)
+
+    def test_backup_into_readonly(self):
+        self.db.commit()
+        with SqliteDict(self.fname, flag='r') as readonly:
+            with self.assertRaises(RuntimeError):
+                self.db.backup(readonly)
@@ -0,0 +1,135 @@
+import os
+import threading
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class BloomFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-bloom.sqlite')
+        with SqliteDict(self.fname, flag='n') as db:
+            db.update(('key%d' % i, i) for i in range(1000))
+            db.commit()
+        self.db = SqliteDict(self.fname, bloom_filter=True)
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def count_lookups(self):
+        """Count the requests that reach the worker thread."""
+        lookups = []
+        select_one = self.db.conn.select_one
+
+        def counting(req, arg=None):
+            lookups.append(req)
+            return select_one(req, arg)
+        self.db.conn.select_one = counting
+        return lookups
+
+    def test_lookups(self):
+        lookups = self.count_lookups()
+        self.assertIn('key42', self.db)
+        self.assertEqual(self.db['key999'], 999)
+        self.assertEqual(len(lookups), 2)
+
+        misses = sum(1 for i in range(1000) if 'missing%d' % i in self.db)
+        self.assertEqual(misses, 0)
+        self.assertLess(len(lookups), 2 + 50)  # the few false positives
+        self.assertIsNone(self.db.get('missing'))
+        with self.assertRaises(KeyError):
+            self.db['missing']
+
+    def test_writes(self):
+        self.db['new'] = 1
+        self.db.update({'updated': 2})
+        self.db.bulk_load([('loaded', 3)])
+        self.db.setdefault('default', 4)
+        self.db.incr('counter')
+        for key in ('new', 'updated', 'loaded', 'default', 'counter'):
+            self.assertIn(key, self.db)
+        self.db.clear()
+        self.assertNotIn('new', self.db)
+        self.db['after clear'] = 5
+        self.assertEqual(self.db['after clear'], 5)
+
+    def test_rebuild_after_deletes(self):
+        bloom = self.db._bloom
+        for i in range(100):
+            del self.db['key%d' % i]
+        self.assertIs(self.db._bloom, bloom)
+        for i in range(100, 300):
+            self.db.pop('key%d' % i)
+        self.assertIsNot(self.db._bloom, bloom)  # past 25% of the 1000 keys
+        self.assertLess(self.db._bloom.deleted, 100)
+        self.assertEqual(len(self.db), 700)
+        self.assertIn('key500', self.db)
+
+    def test_rebuild_when_full(self):
+        bloom = self.db._bloom
+        self.db.update(('new%d' % i, i) for i in range(bloom.capacity))
+        self.assertIsNot(self.db._bloom, bloom)
+        self.assertGreaterEqual(self.db._bloom.capacity, 2 * len(self.db))
+
+    def test_rebuild_while_writing(self):
+        stop = threading.Event()
+        written = []
+
+        def write():
+            while not stop.is_set():
+                key = 'concurrent%d' % len(written)
+                self.db[key] = 1
+                written.append(key)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(5):
+                self.db.rebuild_bloom()
+        finally:
+            stop.set()
+            writer.join()
+        self.assertTrue(all(key in self.db for key in written))
+
+    def test_max_bytes(self):
+        with SqliteDict(self.fname, bloom_filter=True, bloom_max_bytes=64) as small:
+            self.assertEqual(len(small._bloom.bits), 64)
+            self.assertIn('key1', small)
+
+    def test_persist(self):
+        self.db.close()
+        with SqliteDict(self.fname, bloom_filter=True, bloom_persist=True) as db:
+            db['saved'] = 1
+            db.commit()
+            bits = bytes(db._bloom.bits)
+
+        with SqliteDict(self.fname, bloom_filter=True, bloom_persist=True) as db:
+            self.assertEqual(bytes(db._bloom.bits), bits)  # loaded, not rebuilt
+            self.assertIn('saved', db)
+
+        # written by someone without the filter: the saved one is out of date
+        with SqliteDict(self.fname) as db:
+            db['unseen'] = 1
+            db.commit()
+        with SqliteDict(self.fname, bloom_filter=True, bloom_persist=True) as db:
+            self.assertIn('unseen', db)
+
+    def test_requires_bloom_filter(self):
+        with SqliteDict(self.fname) as db:
+            with self.assertRaises(RuntimeError):
+                db.rebuild_bloom()
+
+
+class BloomFilterNonStringKeysTest(unittest.TestCase):
+    def test_int_keys(self):
+        fname = norm_file('tests/db/sqlitedict-bloom-int.sqlite')
+        with SqliteDict(fname, flag='n', bloom_filter=True) as db:
+            db[1] = 'one'
+            self.assertEqual(db[1], 'one')
+            self.assertIn('1', db)
+            db.commit()
+        with SqliteDict(fname, bloom_filter=True) as db:
+            self.assertEqual(db[1], 'one')
+            self.assertNotIn(2, db)
+        os.unlink(fname)
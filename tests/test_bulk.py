@@ -0,0 +1,77 @@
+import os
+import unittest
+
+import sqlitedict
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class BulkLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(norm_file('tests/db/sqlitedict-bulk.sqlite'), flag='n')
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_bulk_load_generator(self):
+        counts = []
+        items = (('key%05d' % i, i) for i in reversed(range(1000)))
+        loaded = self.db.bulk_load(items, batch_size=300, progress=counts.append)
+        self.assertEqual(loaded, 1000)
+        self.assertEqual(counts, [300, 600, 900, 1000])
+        self.assertEqual(len(self.db), 1000)
+        self.assertEqual(self.db['key00042'], 42)
+        # each batch was sorted before insertion
+        self.assertEqual(next(self.db.keys()), 'key00700')
+
+    def test_bulk_load_dict(self):
+        self.assertEqual(self.db.bulk_load({'a': 1, 'b': 2}), 2)
+        self.assertEqual(dict(self.db), {'a': 1, 'b': 2})
+
+    def test_bulk_load_mixed_keys(self):
+        self.assertEqual(self.db.bulk_load([(10, 'a'), ('x', 'b'), (2, 'c')]), 3)
+        self.assertEqual(list(self.db.keys()), ['10', '2', 'x'])  # sorted as stored: as text
+
+    def test_bulk_load_pools(self):
+        for pool in ('thread', 'process'):
+            self.db.clear()
+            self.db.bulk_load(((i, str(i)) for i in range(500)), batch_size=50, workers=2, pool=pool)
+            self.assertEqual(len(self.db), 500)
+            self.assertEqual(self.db[123], '123')
+
+    def test_bulk_load_restores_pragmas(self):
+        cache_size = self.db.conn.select_one('PRAGMA cache_size')[0]
+        self.db.bulk_load([('a', 1)])
+        self.assertEqual(self.db.conn.select_one('PRAGMA cache_size')[0], cache_size)
+
+    def test_bulk_load_autocommit(self):
+        with SqliteDict(autocommit=True) as db:
+            db.bulk_load(((i, i) for i in range(100)), batch_size=10)
+            self.assertEqual(len(db), 100)
+
+    def test_bad_pool(self):
+        with self.assertRaises(ValueError):
+            self.db.bulk_load([('a', 1)], workers=2, pool='fiber')
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(norm_file('tests/db/sqlitedict-export.sqlite'), flag='n')
+        self.db.update(('key%d' % i, {'value': i}) for i in range(25))
+        self.fname = norm_file('tests/db/sqlitedict-export.out')
+
+    def tearDown(self):
+        self.db.terminate()
+        if os.path.isfile(self.fname):
+            os.unlink(self.fname)
+
+    def test_roundtrip(self):
+        for format in sqlitedict.EXPORT_FORMATS:
+            counts = []
+            self.assertEqual(self.db.export(self.fname, format=format, progress=counts.append, progress_every=10), 25)
+            self.assertEqual(counts, [10, 20, 25])
+            self.assertEqual(list(sqlitedict.read_export(self.fname, format=format)), list(self.db.items()))
+
+    def test_bad_format(self):
+        with self.assertRaises(ValueError):
+            self.db.export(self.fname, format='xml')
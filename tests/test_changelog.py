@@ -0,0 +1,49 @@
+import unittest
+
+from sqlitedict import SqliteDict
+
+
+class ChangelogTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(changelog=True)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_changes(self):
+        self.assertEqual(self.db.last_change_seq(), 0)
+        self.db['a'] = 1
+        self.db.update([('b', 2)], c=3)
+        del self.db['a']
+        self.db.bulk_load([('d', 4)])
+        self.db.clear()
+        self.assertEqual(list(self.db.changes_since()), [
+            (1, 'set', 'a'), (2, 'set', 'b'), (3, 'set', 'c'), (4, 'del', 'a'), (5, 'set', 'd'), (6, 'clear', None),
+        ])
+        self.assertEqual(list(self.db.changes_since(3, limit=2)), [(4, 'del', 'a'), (5, 'set', 'd')])
+        self.assertEqual(self.db.last_change_seq(), 6)
+
+    def test_rolled_back_with_the_change(self):
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db['a'] = 1
+                raise ValueError()
+        self.assertEqual(list(self.db.changes_since()), [])
+
+    def test_truncate(self):
+        for i in range(10):
+            self.db[i] = i
+        self.db.truncate_changes(seq=3)
+        self.assertEqual([seq for seq, _, _ in self.db.changes_since()], list(range(4, 11)))
+        self.db.truncate_changes(keep=2)
+        self.assertEqual([seq for seq, _, _ in self.db.changes_since()], [9, 10])
+        self.db.truncate_changes(keep=0)
+        self.assertEqual(list(self.db.changes_since()), [])
+        # sequence numbers are never reused
+        self.db['x'] = 1
+        self.assertEqual(list(self.db.changes_since()), [(11, 'set', 'x')])
+
+    def test_disabled(self):
+        with SqliteDict() as db:
+            db['a'] = 1
+            self.assertNotIn('unnamed__changelog', SqliteDict.get_tablenames(db.filename))
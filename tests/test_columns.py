@@ -0,0 +1,49 @@
+import pickle
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class IterColumnsTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(norm_file('tests/db/sqlitedict-columns.sqlite'), flag='n')
+        self.db.update(('key%d' % i, [i, i]) for i in range(25))
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_batches(self):
+        batches = list(self.db.iter_columns(batch_size=10))
+        self.assertEqual([len(keys) for keys, _ in batches], [10, 10, 5])
+        keys, values = batches[1]
+        self.assertEqual(keys[0], 'key10')
+        self.assertEqual(values[0], [10, 10])
+        self.assertEqual(sum((list(zip(*batch)) for batch in batches), []), list(self.db.items()))
+
+    def test_raw(self):
+        keys, values = next(self.db.iter_columns(decode=False))
+        self.assertEqual(keys[3], 'key3')
+        self.assertIsInstance(values[3], bytes)
+        self.assertEqual(pickle.loads(values[3]), [3, 3])
+
+    def test_empty(self):
+        self.db.clear()
+        self.assertEqual(list(self.db.iter_columns()), [])
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_as_arrays(self):
+        keys, values = next(self.db.iter_columns(batch_size=2, as_arrays=True))
+        self.assertEqual(keys.dtype, object)
+        self.assertEqual(values.shape, (2,))
+        self.assertEqual(values[1], [1, 1])
+
+    def test_immutable(self):
+        self.db.commit()
+        with SqliteDict(self.db.filename, flag='r', immutable=True) as db:
+            self.assertEqual([len(keys) for keys, _ in db.iter_columns(batch_size=20)], [20, 5])
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+import time
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+# takes seconds to run, unless interrupted
+SLOW_QUERY = ('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) '
+              'SELECT MAX(i) FROM n')
+
+
+class DeadlineTest(unittest.TestCase):
+    threaded = True
+
+    def setUp(self):
+        self.db = SqliteDict(':memory:', op_timeout=0.1, threaded=self.threaded)
+        self.db['a'] = 1
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_interrupted(self):
+        started = time.time()
+        with self.assertRaises(TimeoutError):
+            self.db.conn.select_one(SLOW_QUERY)
+        self.assertLess(time.time() - started, 2)
+        # still usable
+        self.assertEqual(self.db['a'], 1)
+        self.db['b'] = 2
+        self.assertEqual(dict(self.db), {'a': 1, 'b': 2})
+
+    def test_call_rolled_back(self):
+        def slow(conn):
+            conn.execute('INSERT INTO unnamed (key, value) VALUES (?, ?)', ('b', self.db.encode(2)))
+            conn.execute(SLOW_QUERY).fetchone()
+
+        with self.assertRaises(TimeoutError):
+            self.db.conn.call(slow)
+        self.assertNotIn('b', self.db)
+
+    def test_deadline(self):
+        self.db.op_timeout = self.db.conn.op_timeout = None
+        with self.db.deadline(0.1):
+            with self.db.deadline(10):  # the outer one is sooner
+                with self.assertRaises(TimeoutError):
+                    self.db.conn.select_one(SLOW_QUERY)
+        with self.db.deadline(0):
+            with self.assertRaises(TimeoutError):
+                self.db['a']
+        self.assertEqual(self.db['a'], 1)
+
+    def test_writes_not_dropped(self):
+        with self.db.deadline(0):
+            self.db['b'] = 2
+            self.db.update({'c': 3})
+        self.assertEqual(dict(self.db), {'a': 1, 'b': 2, 'c': 3})
+
+
+class InlineDeadlineTest(DeadlineTest):
+    threaded = False
+
+    def test_writes_not_dropped(self):
+        # without a worker thread, writes run in the calling thread: they time out too, and raise
+        with self.db.deadline(0):
+            with self.assertRaises(TimeoutError):
+                self.db['b'] = 2
+        self.assertEqual(dict(self.db), {'a': 1})
+
+
+class ImmutableDeadlineTest(unittest.TestCase):
+    def test_interrupted(self):
+        fname = norm_file('tests/db/sqlitedict-deadline.sqlite')
+        with SqliteDict(fname, flag='n') as db:
+            db['a'] = 1
+            db.commit()
+        with SqliteDict(fname, flag='r', immutable=True, op_timeout=0.1) as db:
+            with self.assertRaises(TimeoutError):
+                db.conn.select_one(SLOW_QUERY)
+            with self.assertRaises(TimeoutError):
+                list(db.conn.select(SLOW_QUERY))
+            self.assertEqual(db['a'], 1)
+        os.unlink(fname)
+
+
+class QueuedDeadlineTest(unittest.TestCase):
+    def test_skipped_while_queued(self):
+        with SqliteDict(':memory:') as db:
+            db['a'] = 1
+            busy = threading.Event()
+            executed = []
+
+            def block(conn):
+                busy.set()
+                time.sleep(0.5)
+
+            blocker = threading.Thread(target=db.conn.call, args=(block,))
+            blocker.start()
+            busy.wait()
+            with db.deadline(0.1):
+                with self.assertRaises(TimeoutError):
+                    db.conn.call(lambda conn: executed.append(True))
+            db['b'] = 2  # queued behind the blocking call too, but not dropped
+            blocker.join()
+            self.assertEqual(db['b'], 2)
+            self.assertEqual(executed, [])  # skipped once its deadline had passed
+
+
+class WriteDeadlineTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-deadline-writes.sqlite')
+        self.db = self.locker = None
+
+    def tearDown(self):
+        self.locker.rollback()
+        self.locker.close()
+        self.db.terminate()
+
+    def open(self, **kwargs):
+        self.db = SqliteDict(self.fname, flag='n', op_timeout=0.2, **kwargs)
+        # make the worker thread stall on the next write
+        self.locker = sqlite3.connect(self.fname)
+        self.locker.execute('BEGIN EXCLUSIVE')
+        self.db['stalled'] = 1
+
+    def test_update(self):
+        self.open()
+        started = time.time()
+        with self.assertRaises(TimeoutError):
+            self.db.update((('key%d' % i, i) for i in range(10)), batch_size=1)
+        self.assertLess(time.time() - started, 1)
+
+    def test_wait_for_room(self):
+        self.open(max_queue_items=1)
+        started = time.time()
+        with self.assertRaises(TimeoutError):
+            for i in range(10):
+                self.db['key%d' % i] = i
+        self.assertLess(time.time() - started, 1)
+
+
+class InlineLockedTest(unittest.TestCase):
+    def test_locked(self):
+        fname = norm_file('tests/db/sqlitedict-deadline-locked.sqlite')
+        with SqliteDict(fname, flag='n', threaded=False, op_timeout=0.2) as db:
+            db['a'] = 1
+            db.commit()
+            locker = sqlite3.connect(fname)
+            locker.execute('BEGIN EXCLUSIVE')
+            try:
+                started = time.time()
+                with self.assertRaises(TimeoutError):
+                    db['b'] = 2
+                with self.assertRaises(TimeoutError):
+                    db.get('a')
+                self.assertLess(time.time() - started, 1)
+            finally:
+                locker.rollback()
+                locker.close()
+            self.assertEqual(db['a'], 1)
+            db['b'] = 2
+            self.assertEqual(db['b'], 2)
+        os.unlink(fname)
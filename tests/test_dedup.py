@@ -0,0 +1,105 @@
+import json
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class DedupTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-dedup.sqlite')
+        self.db = SqliteDict(self.fname, flag='n', dedup=True)
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def content(self):
+        """The reference counts of the stored values, by value."""
+        GET_CONTENT = 'SELECT value, refs FROM "unnamed__content"'
+        return dict((self.db.decode(value), refs) for value, refs in self.db.conn.select(GET_CONTENT))
+
+    def test_stored_once(self):
+        shared = 'x' * 10000
+        self.db.update(('key%d' % i, shared) for i in range(100))
+        self.db['other'] = 'y'
+        self.assertEqual(self.content(), {shared: 100, 'y': 1})
+        self.assertEqual(self.db['key42'], shared)
+        self.assertEqual(list(self.db.values()), [shared] * 100 + ['y'])
+        self.assertEqual(dict(self.db.items())['other'], 'y')
+
+    def test_reference_counts(self):
+        self.db.update({'a': 1, 'b': 1, 'c': 2})
+        self.db['a'] = 2
+        self.assertEqual(self.content(), {1: 1, 2: 2})
+        del self.db['b']
+        self.assertEqual(self.db.pop('c'), 2)
+        self.assertEqual(self.content(), {1: 0, 2: 1})
+        self.assertEqual(self.db.collect_garbage(), 1)
+        self.assertEqual(self.content(), {2: 1})
+        self.assertEqual(self.db.update_value('a', lambda value: value + 1), 3)
+        self.assertEqual(self.db.incr('counter'), 1)
+        self.assertEqual(self.db.collect_garbage(), 1)
+        self.assertEqual(self.content(), {3: 1, 1: 1})
+
+    def test_rollback(self):
+        self.db['a'] = 1
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db['a'] = 2
+                self.db['b'] = 2
+                raise ValueError
+        self.assertEqual(self.content(), {1: 1})
+        self.assertEqual(dict(self.db), {'a': 1})
+
+    def test_clear(self):
+        self.db.update({'a': 1, 'b': 2})
+        self.db.clear()
+        self.assertEqual(self.content(), {})
+        self.db['a'] = 1
+        self.assertEqual(self.content(), {1: 1})
+
+    def test_recount(self):
+        self.db.update({'a': 1, 'b': 2})
+        self.db.conn.execute('UPDATE "unnamed__content" SET refs = 5')
+        self.assertEqual(self.db.collect_garbage(recount=True), 0)
+        self.assertEqual(self.content(), {1: 1, 2: 1})
+
+    def test_indexes(self):
+        self.db.add_index('parity', lambda value: value % 2)
+        self.db.update(('key%d' % i, i % 3) for i in range(30))
+        self.assertEqual(len(list(self.db.find('parity', 1))), 10)
+
+    def test_sync(self):
+        with SqliteDict(':memory:', dedup=True, changelog=True) as leader:
+            with SqliteDict(':memory:', dedup=True) as follower:
+                leader.update(('key%d' % i, i % 3) for i in range(30))
+                leader.sync_to(follower)
+                self.assertEqual(dict(follower), dict(leader))
+                leader['key0'] = 5
+                del leader['key1']
+                leader.sync_to(follower)
+                self.assertEqual(dict(follower), dict(leader))
+                GET_REFS = 'SELECT SUM(refs) FROM "unnamed__content"'
+                self.assertEqual(follower.conn.select_one(GET_REFS)[0], 29)
+
+    def test_json_query(self):
+        with SqliteDict(':memory:', dedup=True, encode=json.dumps, decode=json.loads) as db:
+            db.update({'a': {'n': 1}, 'b': {'n': 2}, 'c': {'n': 1}})
+            self.assertEqual([key for key, _ in db.query({'n': 1})], ['a', 'c'])
+            with self.assertRaises(RuntimeError):
+                db.add_json_index('n')
+
+    def test_reopen(self):
+        self.db['a'] = 1
+        self.db.commit()
+        with SqliteDict(self.fname, flag='r', dedup=True) as db:
+            self.assertEqual(db['a'], 1)
+        with SqliteDict(self.fname, tablename='plain') as db:
+            db['a'] = 1
+            db.commit()
+        with self.assertRaises(RuntimeError):
+            SqliteDict(self.fname, tablename='plain', dedup=True)
+        with self.assertRaises(RuntimeError):
+            SqliteDict(self.fname)
+        with self.assertRaises(RuntimeError):
+            SqliteDict(self.fname, flag='r')
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import pickle
+import threading
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+def read_key(args):
+    db, key = args
+    return db[key]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+class ForkTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-fork.sqlite')
+        self.db = SqliteDict(self.fname, flag='n')
+        self.db.update(('key%d' % i, i) for i in range(10))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_fork(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            # child: the worker thread of the parent is gone, this would hang without a reconnect
+            try:
+                self.db['child'] = 'written'
+                self.db.commit()
+                os.write(write_fd, str(self.db['key7']).encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as fin:
+            self.assertEqual(fin.read(), '7')
+        os.waitpid(pid, 0)
+        self.assertEqual(self.db['child'], 'written')
+
+    def test_reconnect_on_first_use(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            try:
+                threads = threading.active_count()  # only this one: no worker thread started yet
+                value = self.db['key3']
+                os.write(write_fd, repr((threads, value, threading.active_count())).encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as fin:
+            self.assertEqual(fin.read(), '(1, 3, 2)')
+        os.waitpid(pid, 0)
+
+    def test_fork_keeps_temp_file(self):
+        db = SqliteDict()
+        pid = os.fork()
+        if not pid:
+            db.close()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertTrue(os.path.isfile(db.filename))
+        db.close()
+
+    def test_pool(self):
+        with multiprocessing.get_context('fork').Pool(2) as pool:
+            results = pool.map(read_key, [(self.db, 'key%d' % i) for i in range(10)])
+        self.assertEqual(results, list(range(10)))
+
+
+class PickleTest(unittest.TestCase):
+    def test_pickle(self):
+        fname = norm_file('tests/db/sqlitedict-pickle.sqlite')
+        with SqliteDict(fname, tablename='t"1', flag='n', autocommit=True) as db:
+            db['key'] = 'value'
+            with pickle.loads(pickle.dumps(db)) as copy:
+                self.assertEqual(copy.tablename, db.tablename)
+                self.assertEqual(copy.flag, 'c')
+                self.assertTrue(copy.autocommit)
+                self.assertEqual(copy['key'], 'value')
+
+    def test_memory(self):
+        with SqliteDict(':memory:') as db:
+            with self.assertRaises(TypeError):
+                pickle.dumps(db)
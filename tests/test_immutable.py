@@ -0,0 +1,56 @@
+import threading
+import unittest
+
+from sqlitedict import SqliteDict, SqliteImmutable
+from accessories import norm_file
+
+
+class ImmutableTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-immutable.sqlite')
+        with SqliteDict(self.fname, flag='n') as db:
+            db.update(('key%d' % i, i) for i in range(100))
+            db.commit()
+        self.db = SqliteDict(self.fname, flag='r', immutable=True)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_read(self):
+        self.assertIsInstance(self.db.conn, SqliteImmutable)
+        self.assertEqual(len(self.db), 100)
+        self.assertEqual(self.db['key42'], 42)
+        self.assertIn('key99', self.db)
+        self.assertEqual(list(self.db.values()), list(range(100)))
+
+    def test_read_from_threads(self):
+        results = {}
+
+        def read(i):
+            results[i] = self.db['key%d' % i]
+
+        threads = [threading.Thread(target=read, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, dict((i, i) for i in range(10)))
+
+    def test_write(self):
+        with self.assertRaises(RuntimeError):
+            self.db['key'] = 'value'
+        with self.assertRaises(RuntimeError):
+            self.db.conn.execute('DELETE FROM unnamed')
+
+    def test_closed(self):
+        self.db.close()
+        with self.db:
+            self.assertEqual(self.db['key1'], 1)
+
+    def test_requires_flag_r(self):
+        with self.assertRaises(RuntimeError):
+            SqliteDict(self.fname, immutable=True)
+
+    def test_missing_table(self):
+        with self.assertRaises(RuntimeError):
+            SqliteDict(self.fname, tablename='table404', flag='r', immutable=True)
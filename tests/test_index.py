@@ -0,0 +1,69 @@
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class SecondaryIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-index.sqlite')
+        self.db = SqliteDict(self.fname, flag='n')
+        self.db.update(('key%d' % i, {'user_id': i % 3, 'age': i}) for i in range(10))
+        self.db.add_index('user', lambda value: value.get('user_id'))
+        self.db.add_index('age', lambda value: value.get('age'))
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def find_keys(self, name, value):
+        return sorted(key for key, _ in self.db.find(name, value))
+
+    def test_existing_values_indexed(self):
+        self.assertEqual(self.find_keys('user', 1), ['key1', 'key4', 'key7'])
+        self.assertEqual(list(self.db.find('user', 1))[0], ('key1', {'user_id': 1, 'age': 1}))
+
+    def test_setitem(self):
+        self.db['key1'] = {'user_id': 2}
+        self.db['new'] = {'user_id': 1}
+        self.assertEqual(self.find_keys('user', 1), ['key4', 'key7', 'new'])
+        self.assertIn('key1', self.find_keys('user', 2))
+
+    def test_update_and_bulk_load(self):
+        self.db.update([('a', {'user_id': 5})], b={'user_id': 5})
+        self.db.bulk_load([('c', {'user_id': 5}), ('key0', {'user_id': 5})], batch_size=1, workers=2)
+        self.assertEqual(self.find_keys('user', 5), ['a', 'b', 'c', 'key0'])
+
+    def test_delete_and_clear(self):
+        del self.db['key4']
+        self.assertEqual(self.find_keys('user', 1), ['key1', 'key7'])
+        self.db.clear()
+        self.assertEqual(self.find_keys('user', 1), [])
+
+    def test_none_not_indexed(self):
+        self.db['nouser'] = {'age': 100}
+        self.assertEqual(list(self.db.find('user', None)), [])
+        self.assertEqual(self.find_keys('age', 100), ['nouser'])
+
+    def test_find_range(self):
+        self.assertEqual([key for key, _ in self.db.find_range('age', 3, 5)], ['key3', 'key4', 'key5'])
+        self.assertEqual([key for key, _ in self.db.find_range('age', lo=8)], ['key8', 'key9'])
+        self.assertEqual(len(list(self.db.find_range('age'))), 10)
+
+    def test_unknown_index(self):
+        with self.assertRaises(KeyError):
+            self.db.find('nosuchindex', 1)
+        self.db.drop_index('age')
+        with self.assertRaises(KeyError):
+            self.db.find_range('age', 1, 2)
+
+    def test_reopen(self):
+        self.db.commit()
+        self.db.close()
+        self.db = SqliteDict(self.fname)
+        # the existing entries are reused, not rebuilt
+        self.db.add_index('user', lambda value: 'not rebuilt')
+        self.assertEqual(self.find_keys('user', 1), ['key1', 'key4', 'key7'])
+        self.db.add_index('user', lambda value: value['user_id'], rebuild=True)
+        self.assertEqual(self.find_keys('user', 1), ['key1', 'key4', 'key7'])
+        with SqliteDict(self.fname, flag='w') as db:
+            self.assertEqual(list(db.conn.select('SELECT * FROM unnamed__index')), [])
@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from sqlitedict import SqliteDict, SqliteInline
+from accessories import norm_file
+
+
+class InlineTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-inline.sqlite')
+        self.db = SqliteDict(self.fname, flag='n', threaded=False)
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_dict_api(self):
+        self.assertIsInstance(self.db.conn, SqliteInline)
+        self.db['a'] = 1
+        self.db.update({'b': 2, 'c': 3})
+        del self.db['c']
+        self.assertEqual(dict(self.db), {'a': 1, 'b': 2})
+        self.assertEqual(len(self.db), 2)
+        self.assertIn('a', self.db)
+        with self.assertRaises(KeyError):
+            self.db['c']
+        self.db.commit()
+        with SqliteDict(self.fname) as other:
+            self.assertEqual(other['b'], 2)
+
+    def test_iterate_while_writing(self):
+        self.db.update(('key%d' % i, i) for i in range(10))
+        for key in self.db:
+            del self.db[key]
+        self.assertEqual(len(self.db), 0)
+
+    def test_other_thread(self):
+        errors = []
+
+        def read():
+            try:
+                self.db['a']
+            except RuntimeError as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+
+    def test_errors_raised_directly(self):
+        with self.assertRaises(Exception):
+            self.db.conn.execute('INSERT INTO nonexistent VALUES (1)')
+        self.db['a'] = 1  # not poisoned by the earlier error
+        self.assertEqual(self.db['a'], 1)
+
+    def test_transaction(self):
+        self.db['a'] = 1
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db['a'] = 2
+                raise ValueError()
+        self.assertEqual(self.db['a'], 1)
+        with self.db.transaction():
+            self.db['a'] = 3
+        with SqliteDict(self.fname) as other:
+            self.assertEqual(other['a'], 3)
+
+    def test_autocommit(self):
+        with SqliteDict(self.fname, autocommit=True, threaded=False) as db:
+            db['a'] = 1
+            db.update({'b': 2})
+            with SqliteDict(self.fname) as other:
+                self.assertEqual(dict(other), {'a': 1, 'b': 2})
+
+    def test_group_commit(self):
+        with SqliteDict(self.fname, commit_every=2, threaded=False) as db:
+            db['a'] = 1
+            self.assertTrue(db.conn._conn.in_transaction)
+            db['b'] = 2
+            self.assertFalse(db.conn._conn.in_transaction)
+
+    def test_features(self):
+        self.db.add_index('value', lambda value: value)
+        self.db.update({'a': 1, 'b': 2}, batch_size=1)
+        self.assertEqual([key for key, _ in self.db.find('value', 2)], ['b'])
+        self.assertEqual(list(self.db.itervalues(workers=2, pool='thread')), [1, 2])
+        self.assertEqual(next(self.db.iter_columns()), (['a', 'b'], [1, 2]))
@@ -0,0 +1,80 @@
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class ParallelDecodeTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(norm_file('tests/db/sqlitedict-parallel.sqlite'), flag='n')
+        self.db.update(('key%d' % i, {'value': i}) for i in range(1000))
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_itervalues(self):
+        expected = list(self.db.itervalues())
+        for pool in ('thread', 'process'):
+            self.assertEqual(list(self.db.itervalues(workers=2, pool=pool, batch_size=64)), expected)
+
+    def test_iteritems(self):
+        expected = list(self.db.iteritems())
+        for pool in ('thread', 'process'):
+            self.assertEqual(list(self.db.iteritems(workers=2, pool=pool, batch_size=64)), expected)
+
+    def test_read_as_consumed(self):
+        requests = []
+        select = self.db.conn.select
+
+        def counting(req, arg=None):
+            requests.append(req)
+            return select(req, arg)
+        self.db.conn.select = counting
+        values = self.db.itervalues(workers=1, pool='thread', batch_size=10)
+        self.assertEqual(next(values), {'value': 0})
+        self.assertEqual(len(requests), 2)  # the pages in flight, not the whole table
+        self.assertEqual(len(list(values)), 999)
+        self.assertEqual(len(requests), 101)  # the last one finds no more rows
+
+    def test_gaps_and_dedup(self):
+        self.db.conn.execute('DELETE FROM unnamed WHERE rowid % 7 = 0')
+        expected = list(self.db.iteritems())
+        self.assertEqual(list(self.db.iteritems(workers=2, pool='thread', batch_size=10)), expected)
+        with SqliteDict(':memory:', dedup=True) as db:
+            db.update(('key%d' % i, i % 3) for i in range(100))
+            self.assertEqual(list(db.iteritems(workers=2, pool='thread', batch_size=7)), list(db.iteritems()))
+
+    def test_bad_pool(self):
+        with self.assertRaises(ValueError):
+            list(self.db.itervalues(workers=2, pool='fiber'))
+
+
+class StreamingUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(norm_file('tests/db/sqlitedict-update.sqlite'), flag='n')
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_batches(self):
+        consumed = []
+
+        def items():
+            for i in range(1000):
+                consumed.append(i)
+                yield 'key%d' % i, i
+
+        self.db.update(items(), batch_size=100)
+        self.assertEqual(len(consumed), 1000)
+        self.assertEqual(dict(self.db), dict(('key%d' % i, i) for i in range(1000)))
+
+    def test_encode_workers(self):
+        for pool in ('thread', 'process'):
+            self.db.clear()
+            self.db.update((('key%d' % i, [i]) for i in range(1000)), batch_size=64, encode_workers=2, pool=pool)
+            self.assertEqual(list(self.db.items()), [('key%d' % i, [i]) for i in range(1000)])
+
+    def test_indexes_and_kwds(self):
+        self.db.add_index('value', lambda value: value)
+        self.db.update({'a': 1, 'b': 2}, encode_workers=2, c=1)
+        self.assertEqual(sorted(key for key, _ in self.db.find('value', 1)), ['a', 'c'])
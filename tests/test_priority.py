@@ -0,0 +1,76 @@
+import threading
+import unittest
+import weakref
+from queue import Queue
+
+from sqlitedict import SqliteDict, _PriorityRequests
+
+
+def write(name):
+    return ('INSERT %s' % name, (), None, None, 0)
+
+
+def read(name, res=Queue()):
+    return ('SELECT %s' % name, (), weakref.ref(res), None, 0)
+
+
+class PriorityRequestsTest(unittest.TestCase):
+    def setUp(self):
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.done.set()
+
+    def put_from_thread(self, queue, items):
+        def put():
+            for item in items:
+                queue.put(item)
+            put_done.set()
+            self.done.wait()  # stay alive, so that the thread ident is not reused by the next thread
+
+        put_done = threading.Event()
+        threading.Thread(target=put).start()
+        put_done.wait()
+
+    def drain(self, queue):
+        return [queue.get()[0].split()[1] for _ in range(queue.qsize())]
+
+    def test_reads_first(self):
+        queue = _PriorityRequests(2)
+        self.put_from_thread(queue, [write('w%d' % i) for i in range(4)])
+        for i in range(3):
+            queue.put(read('r%d' % i))
+        self.assertEqual(self.drain(queue), ['r0', 'r1', 'w0', 'r2', 'w1', 'w2', 'w3'])
+
+    def test_strict(self):
+        queue = _PriorityRequests(float('inf'))
+        self.put_from_thread(queue, [write('w%d' % i) for i in range(2)])
+        for i in range(3):
+            queue.put(read('r%d' % i))
+        self.assertEqual(self.drain(queue), ['r0', 'r1', 'r2', 'w0', 'w1'])
+
+    def test_read_own_writes(self):
+        queue = _PriorityRequests(10)
+        self.put_from_thread(queue, [write('w0')])
+        queue.put(write('w1'))
+        queue.put(read('r0'))
+        self.put_from_thread(queue, [read('r1')])
+        self.assertEqual(self.drain(queue), ['r1', 'w0', 'w1', 'r0'])
+
+    def test_magic_requests_keep_order(self):
+        queue = _PriorityRequests(10)
+        self.put_from_thread(queue, [write('w0')])
+        queue.put(('--commit-- c0', (), weakref.ref(Queue()), None, 0))
+        self.assertEqual(self.drain(queue), ['w0', 'c0'])
+
+
+class ReadPriorityTest(unittest.TestCase):
+    def test_dict(self):
+        with SqliteDict(read_priority=4, autocommit=True) as db:
+            for i in range(100):
+                db['key%d' % i] = i
+                self.assertEqual(db['key%d' % i], i)
+            with db.transaction():
+                db['key0'] = 'changed'
+            self.assertEqual(db['key0'], 'changed')
+            self.assertEqual(len(db), 100)
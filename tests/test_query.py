@@ -0,0 +1,56 @@
+import json
+import unittest
+
+from sqlitedict import SqliteDict
+
+
+class JsonQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(encode=json.dumps, decode=json.loads)
+        for i in range(10):
+            self.db['key%d' % i] = {'user': {'id': i % 3}, 'age': i, 'active': i % 2 == 0, 'tags': ['t%d' % i]}
+        self.db['empty'] = {}
+
+    def tearDown(self):
+        self.db.close()
+
+    def keys(self, **kwargs):
+        return [key for key, _ in self.db.query(**kwargs)]
+
+    def test_equality(self):
+        self.assertEqual(self.keys(where={'user.id': 1}), ['key1', 'key4', 'key7'])
+        self.assertEqual(self.keys(where={'user.id': 1, 'active': True}), ['key4'])
+        self.assertEqual(self.keys(where={'$.tags[0]': 't5'}), ['key5'])
+        self.assertEqual(list(self.db.query(where={'age': 3})), [('key3', self.db['key3'])])
+
+    def test_quoted_field(self):
+        self.db['weird'] = {'we"ird': 1}
+        with self.assertRaises(ValueError):
+            list(self.db.query(where={'we"ird': 1}))
+
+    def test_operators(self):
+        self.assertEqual(self.keys(where={'age': ('>=', 8)}), ['key8', 'key9'])
+        self.assertEqual(self.keys(where={'age': ('!=', None)}), ['key%d' % i for i in range(10)])
+        self.assertEqual(self.keys(where={'age': None}), ['empty'])
+        with self.assertRaises(ValueError):
+            self.keys(where={'age': ('LIKE', 3)})
+
+    def test_fields_and_limit(self):
+        result = list(self.db.query(where={'age': ('<', 5)}, fields=['age', 'active', 'user', 'nope'], limit=2))
+        self.assertEqual(result, [
+            ('key0', {'age': 0, 'active': True, 'user': {'id': 0}, 'nope': None}),
+            ('key1', {'age': 1, 'active': False, 'user': {'id': 1}, 'nope': None}),
+        ])
+        self.assertEqual(list(self.db.query(where={'age': 9}, fields=['age'])), [('key9', {'age': 9})])
+
+    def test_json_index(self):
+        self.db.add_json_index('user.id')
+        plan = list(self.db.conn.select(
+            'EXPLAIN QUERY PLAN SELECT key FROM unnamed WHERE %s = ?' % self.db._json_field('user.id'), (1,)))
+        self.assertIn('unnamed__json_user.id', str(plan))
+        self.assertEqual(self.keys(where={'user.id': 1}), ['key1', 'key4', 'key7'])
+
+    def test_requires_json(self):
+        with SqliteDict() as db:
+            with self.assertRaises(RuntimeError):
+                list(db.query(where={'a': 1}))
@@ -0,0 +1,62 @@
+import unittest
+
+from sqlitedict import SqliteDict
+
+
+class SampleTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SqliteDict(':memory:')
+        self.db.update(('key%d' % i, i) for i in range(10000))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_sample(self):
+        sample = self.db.sample(100)
+        self.assertEqual(len(sample), 100)
+        self.assertEqual(len(set(sample)), 100)
+        for key, value in sample:
+            self.assertEqual(key, 'key%d' % value)
+
+    def test_seed(self):
+        self.assertEqual(self.db.sample(10, seed=1), self.db.sample(10, seed=1))
+        self.assertNotEqual(self.db.sample(10, seed=1), self.db.sample(10, seed=2))
+
+    def test_gaps(self):
+        self.db.conn.execute('DELETE FROM unnamed WHERE rowid % 3 = 1')  # key0, key3, ...
+        sample = self.db.sample(1000, seed=0)
+        self.assertEqual(len(set(sample)), 1000)
+        self.assertTrue(all(value % 3 for _, value in sample))
+
+    def test_sparse(self):
+        # too few rows left for probing: falls back to a scan
+        self.db.clear()
+        self.db.update(('key%d' % i, i) for i in range(10000))
+        self.db.conn.execute("DELETE FROM unnamed WHERE key NOT IN ('key0', 'key9999')")
+        self.assertEqual(sorted(self.db.sample(5)), [('key0', 0), ('key9999', 9999)])
+
+    def test_fewer_items(self):
+        with SqliteDict(':memory:') as db:
+            self.assertEqual(db.sample(5), [])
+            db.update({'a': 1, 'b': 2})
+            self.assertEqual(sorted(db.sample(5)), [('a', 1), ('b', 2)])
+
+    def test_dedup(self):
+        with SqliteDict(':memory:', dedup=True) as db:
+            db.update(('key%d' % i, i % 2) for i in range(100))
+            self.assertEqual(len(db.sample(10)), 10)
+
+    def test_approx_len(self):
+        self.assertEqual(self.db.approx_len(probes=20000), 10000)
+        approx = self.db.approx_len()
+        self.assertEqual(approx, 10000)  # no gaps
+        self.db.conn.execute('DELETE FROM unnamed WHERE rowid % 2 = 0')
+        approx = self.db.approx_len()
+        self.assertTrue(4000 < approx < 6000, approx)
+
+    def test_approx_len_analyzed(self):
+        self.db.conn.execute('ANALYZE')
+        self.db['new'] = 1
+        self.assertEqual(self.db.approx_len(), 10000)  # as of ANALYZE
+        with SqliteDict(':memory:') as db:
+            self.assertEqual(db.approx_len(), 0)
@@ -0,0 +1,57 @@
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class StorageStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-stats.sqlite')
+        self.db = SqliteDict(self.fname, flag='n', encode=str.encode, decode=bytes.decode)
+        self.db.update(('k%d' % i, 'x' * i) for i in range(100))
+        self.db['big'] = 'x' * 100000
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def test_sizes(self):
+        stats = self.db.storage_stats()
+        self.assertEqual(stats['rows'], 101)
+        self.assertEqual(stats['key_bytes'], 10 * 2 + 90 * 3 + 3)
+        self.assertEqual(stats['value_bytes'], sum(range(100)) + 100000)
+        self.assertEqual(stats['max_value_bytes'], 100000)
+        self.assertAlmostEqual(stats['avg_value_bytes'], stats['value_bytes'] / 101)
+        self.assertEqual(stats['value_size_histogram'], {
+            0: 1, 1: 1, 2: 1, 4: 2, 8: 4, 16: 8, 32: 16, 64: 32, 128: 35, 131072: 1})
+
+    def test_pages(self):
+        stats = self.db.storage_stats()
+        if stats['pages'] is None:
+            self.skipTest('SQLite built without dbstat')
+        self.assertEqual(set(stats['pages']), {'unnamed', 'sqlite_autoindex_unnamed_1'})
+        self.assertGreater(stats['pages']['unnamed']['overflow_pages'], 0)
+        self.assertLessEqual(sum(p['pages'] for p in stats['pages'].values()), stats['page_count'])
+        self.assertEqual(stats['freelist_pages'], 0)
+
+    def test_dedup(self):
+        with SqliteDict(':memory:', dedup=True, encode=str.encode, decode=bytes.decode) as db:
+            db.update(('k%d' % i, 'x' * 100) for i in range(49))
+            db['other'] = 'y' * 10
+            stats = db.storage_stats()
+        self.assertEqual(stats['rows'], 50)
+        self.assertEqual(stats['value_bytes'], 49 * 100 + 10)
+        self.assertEqual(stats['max_value_bytes'], 100)
+        self.assertEqual(stats['value_size_histogram'], {16: 1, 128: 49})
+        self.assertEqual(stats['stored_value_bytes'], 110)
+        if stats['pages'] is not None:
+            self.assertIn('unnamed__content', stats['pages'])
+
+    def test_catalog(self):
+        with SqliteDict(self.fname, tablename='other') as other:
+            other['a'] = 'b'
+            other.commit()
+        catalog = SqliteDict.get_tablenames(self.fname, stats=True)
+        self.assertEqual(list(catalog), ['unnamed', 'other'])
+        self.assertEqual(catalog['other']['rows'], 1)
+        self.assertEqual(catalog['unnamed']['rows'], 101)
@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-sync-leader.sqlite')
+        self.follower_fname = norm_file('tests/db/sqlitedict-sync-follower.sqlite')
+        if os.path.isfile(self.follower_fname):
+            os.unlink(self.follower_fname)
+        self.db = SqliteDict(self.fname, flag='n', changelog=True)
+        self.db.update(('key%d' % i, i) for i in range(100))
+
+    def tearDown(self):
+        self.db.terminate()
+        if os.path.isfile(self.follower_fname):
+            os.unlink(self.follower_fname)
+
+    def test_sync_to_file(self):
+        self.assertEqual(self.db.sync_to(self.follower_fname), self.db.last_change_seq())
+        with SqliteDict(self.follower_fname, flag='r') as follower:
+            self.assertEqual(dict(follower), dict(self.db))
+
+    def test_incremental(self):
+        with SqliteDict(self.follower_fname) as follower:
+            self.db.sync_to(follower)
+            self.db['key1'] = 'changed'
+            self.db['new'] = 'added'
+            del self.db['key2']
+            self.db['key3'] = 'deleted later'
+            del self.db['key3']
+            seq = self.db.sync_to(follower, batch_size=2)
+            self.assertEqual(seq, self.db.last_change_seq())
+            self.assertEqual(dict(follower), dict(self.db))
+            self.assertEqual(follower['key1'], 'changed')
+            self.assertNotIn('key2', follower)
+
+            # nothing new
+            self.assertEqual(self.db.sync_to(follower), seq)
+
+    def test_sync_from(self):
+        self.db.commit()
+        with SqliteDict(self.follower_fname) as follower:
+            follower['stale'] = True
+            follower.sync_from(self.fname)
+            self.assertEqual(dict(follower), dict(self.db))
+            self.db.clear()
+            self.db['after clear'] = 1
+            follower.sync_from(self.db)
+            self.assertEqual(dict(follower), {'after clear': 1})
+
+    def test_truncated_changelog(self):
+        with SqliteDict(self.follower_fname) as follower:
+            self.db.sync_to(follower)
+            for i in range(10):
+                self.db['key%d' % i] = -i
+            self.db.truncate_changes(keep=3)
+            self.db.sync_to(follower)
+            self.assertEqual(dict(follower), dict(self.db))
+
+    def test_follower_indexes(self):
+        with SqliteDict(self.follower_fname) as follower:
+            follower.add_index('parity', lambda value: value % 2)
+            self.db.sync_to(follower)
+            self.db['key0'] = 1
+            self.db.sync_to(follower)
+            self.assertEqual(len(list(follower.find('parity', 0))), 49)
+
+    def test_requires_changelog(self):
+        with SqliteDict() as leader:
+            with self.assertRaises(RuntimeError):
+                leader.sync_to(self.follower_fname)
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import unittest
+
+from sqlitedict import SqliteDict, TieredSqliteDict
+from accessories import norm_file
+
+
+class TieredTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-tiered.sqlite')
+        with SqliteDict(self.fname, flag='n') as db:
+            db.update(('key%d' % i, i) for i in range(100))
+            db.commit()
+        self.db = TieredSqliteDict(self.fname, hot_size=10, flush_every=5)
+
+    def tearDown(self):
+        self.db.close()
+        os.unlink(self.fname)
+
+    def test_promote_and_evict(self):
+        self.assertEqual(self.db['key1'], 1)
+        self.assertEqual(self.db['key1'], 1)
+        self.assertEqual((self.db.hits, self.db.misses), (1, 1))
+        for i in range(2, 12):
+            self.db['key%d' % i]
+        self.assertEqual(self.db.hot_keys(), ['key%d' % i for i in range(2, 12)])  # key1 evicted
+        self.db['key5']
+        self.assertEqual(self.db.hot_keys()[-1], 'key5')
+        self.assertIsNone(self.db.get('missing'))
+        with self.assertRaises(KeyError):
+            self.db['missing']
+
+    def test_write_back(self):
+        self.db['new'] = 'value'
+        self.assertNotIn('new', self.db.store)  # not written back yet
+        self.assertIn('new', self.db)
+        for i in range(4):
+            self.db['key%d' % i] = -i
+        self.assertEqual(self.db.store['new'], 'value')
+        self.assertEqual(self.db.store['key3'], -3)
+
+    def test_evicted_before_write_back(self):
+        for i in range(12):
+            self.db['new%d' % i] = i
+        self.db.flush()
+        self.assertEqual(self.db.store['new0'], 0)
+        self.assertEqual(self.db['new0'], 0)
+
+    def test_delete(self):
+        self.db['key1']
+        del self.db['key1']
+        del self.db['key2']
+        self.assertNotIn('key1', self.db)
+        with self.assertRaises(KeyError):
+            self.db['key2']
+        with self.assertRaises(KeyError):
+            del self.db['key2']
+        self.assertEqual(len(self.db), 98)
+        self.assertNotIn('key2', self.db.store)
+
+    def test_iterate(self):
+        self.db['key0'] = 'changed'
+        self.assertEqual(dict(self.db.items())['key0'], 'changed')
+        self.assertEqual(len(list(self.db)), 100)
+        self.db.clear()
+        self.assertFalse(self.db)
+
+    def test_warm(self):
+        for i in range(20):
+            self.db['key%d' % i]
+        self.db['extra'] = 'value'
+        self.db.commit()
+        hot = self.db.hot_keys()
+        self.db.close()
+
+        self.db = TieredSqliteDict(self.fname, hot_size=10)
+        self.assertEqual(self.db.hot_keys(), hot)
+        self.assertEqual(self.db['extra'], 'value')
+        self.assertEqual(self.db.misses, 0)
+
+        with TieredSqliteDict(self.fname, warm=False) as cold:
+            self.assertEqual(cold.hot_keys(), [])
+
+    def test_readonly(self):
+        self.db.close()
+        self.db = TieredSqliteDict(self.fname, flag='r')
+        self.assertEqual(self.db['key1'], 1)
+        with self.assertRaises(RuntimeError):
+            self.db['key1'] = 2
+
+    def test_miss_does_not_block_hits(self):
+        self.db['key1']
+        busy = threading.Event()
+
+        def block(conn):
+            busy.set()
+            time.sleep(0.5)
+        blocker = threading.Thread(target=self.db.store.conn.call, args=(block,))
+        blocker.start()
+        busy.wait()
+        reader = threading.Thread(target=self.db.__getitem__, args=('key2',))  # waits for the blocked worker
+        reader.start()
+        started = time.time()
+        self.assertEqual(self.db['key1'], 1)
+        self.assertIn('key1', self.db)
+        self.assertLess(time.time() - started, 0.25)
+        reader.join()
+        blocker.join()
+        self.assertIn('key2', self.db.hot_keys())
+
+    def test_write_during_miss(self):
+        busy = threading.Event()
+
+        def block(conn):
+            busy.set()
+            time.sleep(0.2)
+        blocker = threading.Thread(target=self.db.store.conn.call, args=(block,))
+        blocker.start()
+        busy.wait()
+        reader = threading.Thread(target=self.db.__getitem__, args=('key2',))
+        reader.start()
+        time.sleep(0.05)
+        self.db['key2'] = 'new'
+        reader.join()
+        blocker.join()
+        self.assertEqual(self.db['key2'], 'new')  # not replaced by the value read before the write
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_fork(self):
+        self.db['key1']
+        self.db['pending'] = 'parent'
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with self.db._lock:
+                locked.set()
+                release.wait()
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            # child: would deadlock on the lock held by the other thread of the parent
+            try:
+                os.write(write_fd, repr((self.db['key1'], 'pending' in self.db.hot_keys())).encode())
+            finally:
+                os._exit(0)
+        release.set()
+        holder.join()
+        os.close(write_fd)
+        with os.fdopen(read_fd) as fin:
+            self.assertEqual(fin.read(), '(1, False)')
+        os.waitpid(pid, 0)
+        self.assertEqual(self.db['pending'], 'parent')
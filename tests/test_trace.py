@@ -0,0 +1,47 @@
+import logging
+import unittest
+
+from sqlitedict import SqliteDict
+
+
+class SlowLogTest(unittest.TestCase):
+    def test_report(self):
+        reports = []
+        with SqliteDict(slow_threshold=0, on_slow=reports.append, explain_slow=True) as db:
+            db['key'] = 'value'
+            self.assertEqual(db['key'], 'value')
+        report = [report for report in reports if report['request'].startswith('SELECT value')][0]
+        self.assertEqual(len(report['statements']), 1)
+        self.assertGreaterEqual(report['queue_wait'], 0)
+        self.assertGreaterEqual(report['execution'], 0)
+        self.assertTrue(any('USING INDEX' in str(row) for row in report['plan']))
+        self.assertTrue(any('test_report' in line for line in report['stack']))
+
+    def test_threshold(self):
+        reports = []
+        with SqliteDict(slow_threshold=60, on_slow=reports.append) as db:
+            db['key'] = 'value'
+            db.commit()
+        self.assertEqual(reports, [])
+
+    def test_sampling(self):
+        reports = []
+        with SqliteDict(slow_threshold=0, on_slow=reports.append, trace_sample=0) as db:
+            db['key'] = 'value'
+            db.commit()
+        self.assertEqual(reports, [])
+
+    def test_batch_traced(self):
+        reports = []
+        with SqliteDict(autocommit=True, slow_threshold=0, on_slow=reports.append) as db:
+            db.update({'a': 1, 'b': 2})
+        report = [report for report in reports if report['request'] == '--executemany--'][0]
+        self.assertEqual(sum(statement.startswith('REPLACE') for statement in report['statements']), 2)
+        self.assertIsNone(report['plan'])
+
+    def test_log(self):
+        with self.assertLogs('sqlitedict.SqliteMultithread', logging.WARNING) as logs:
+            with SqliteDict(slow_threshold=0, outer_stack=False) as db:
+                db['key'] = 'value'
+                db.commit()
+        self.assertIn('slow operation', logs.output[0])
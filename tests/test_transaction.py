@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+import time
+import unittest
+
+from sqlitedict import SqliteDict
+from accessories import norm_file
+
+
+class TransactionTest(unittest.TestCase):
+    autocommit = False
+
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-transaction.sqlite')
+        self.db = SqliteDict(self.fname, flag='n', autocommit=self.autocommit)
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def committed(self):
+        with SqliteDict(self.fname, flag='r') as db:
+            return dict(db)
+
+    def test_commit(self):
+        with self.db.transaction():
+            self.db['a'] = 1
+            self.db.update(b=2)
+        self.assertEqual(self.committed(), {'a': 1, 'b': 2})
+
+    def test_rollback(self):
+        self.db['a'] = 1
+        with self.assertRaises(ZeroDivisionError):
+            with self.db.transaction():
+                self.db['a'] = 2
+                self.db['b'] = 2
+                1 / 0
+        self.assertEqual(dict(self.db), {'a': 1})
+
+    def test_nested(self):
+        with self.db.transaction():
+            self.db['a'] = 1
+            with self.assertRaises(KeyError):
+                with self.db.transaction():
+                    self.db['b'] = 2
+                    raise KeyError('b')
+            with self.db.transaction():
+                self.db['c'] = 3
+            # the inner blocks do not commit on their own
+            self.assertEqual(self.committed(), {})
+        self.assertEqual(self.committed(), {'a': 1, 'c': 3})
+
+    def test_commit_suspended(self):
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db['a'] = 1
+                self.db.commit()
+                raise ValueError()
+        self.assertEqual(dict(self.db), {})
+
+    def test_failed_write(self):
+        self.db['a'] = 0
+        with self.assertRaises(sqlite3.OperationalError):
+            with self.db.transaction():
+                self.db['a'] = 1
+                self.db.conn.execute('INSERT INTO missing VALUES (1)')  # fails in the worker thread
+                self.db['b'] = 2
+        self.assertEqual(dict(self.db), {'a': 0})
+        # the savepoint is closed: commits work again
+        self.db['c'] = 3
+        self.db.commit()
+        self.assertEqual(self.committed(), {'a': 0, 'c': 3})
+
+    def test_failed_write_nested(self):
+        with self.db.transaction():
+            self.db['a'] = 1
+            with self.assertRaises(sqlite3.OperationalError):
+                with self.db.transaction():
+                    self.db['b'] = 2
+                    self.db.conn.execute('INSERT INTO missing VALUES (1)')
+            self.db['c'] = 3
+        self.assertEqual(self.committed(), {'a': 1, 'c': 3})
+
+    def test_threads(self):
+        entered, exited = threading.Event(), threading.Event()
+        errors = []
+
+        def other():
+            try:
+                entered.wait()
+                with self.db.transaction():  # waits for the block of the main thread
+                    self.assertTrue(exited.is_set())
+                    self.db['b'] = 2
+                    raise KeyError('b')
+            except KeyError:
+                pass
+            except Exception as e:
+                errors.append(e)
+        thread = threading.Thread(target=other)
+        thread.start()
+        with self.db.transaction():
+            entered.set()
+            time.sleep(0.05)
+            self.db['a'] = 1
+            exited.set()
+        thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.committed(), {'a': 1})
+
+
+class AutocommitTransactionTest(TransactionTest):
+    autocommit = True
+
+
+class GroupCommitTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = norm_file('tests/db/sqlitedict-group-commit.sqlite')
+
+    def tearDown(self):
+        self.db.terminate()
+
+    def committed(self):
+        with SqliteDict(self.fname, flag='r') as db:
+            return len(db)
+
+    def test_commit_every(self):
+        self.db = SqliteDict(self.fname, flag='n', commit_every=10)
+        for i in range(25):
+            self.db[i] = i
+        self.assertEqual(len(self.db), 25)  # also waits for the writes to be processed
+        self.assertEqual(self.committed(), 20)
+        self.db.close()
+        self.assertEqual(self.committed(), 25)
+
+    def test_commit_interval(self):
+        self.db = SqliteDict(self.fname, flag='n', commit_interval=0.05)
+        self.db['a'] = 1
+        self.assertEqual(len(self.db), 1)
+        self.assertEqual(self.committed(), 0)
+        time.sleep(0.2)
+        self.assertEqual(self.committed(), 1)